@@ -0,0 +1,187 @@
+import time
+from typing import Any, Dict, Optional, Tuple
+from ..services.http_client import get_http_client
+from ..services.cpu_pool import run_in_pool
+from ..services.metrics import FETCH_SECONDS, STAGE_SECONDS
+from ..services.server_timing import stage, record
+from .jsonld_scanner import JsonLdScanner
+
+DEFAULT_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (compatible; RecipeBot/1.0)'
+}
+
+# --- Parsing helpers. These run inside the extraction pool workers, so they take
+# --- raw bytes and return plain picklable values (lxml trees can't cross processes).
+# --- lxml and trafilatura are imported in here rather than at the top: the web
+# --- process never parses HTML itself unless CPU_POOL_WORKERS=0, and the
+# --- import costs ~100ms of every cold start.
+
+def parse_tree(raw: bytes, encoding: Optional[str] = None):
+    """Parse HTML bytes into an lxml tree, or None if the page is not parseable HTML"""
+    if not raw:
+        return None
+    import lxml.html
+    try:
+        try:
+            parser = lxml.html.HTMLParser(encoding=encoding) if encoding else None
+        except LookupError:
+            parser = None  # Unknown charset in the headers, let lxml sniff it
+        return lxml.html.document_fromstring(raw, parser=parser)
+    except lxml.etree.ParserError:
+        return None
+
+def extract_main_content(raw: bytes, encoding: Optional[str] = None) -> Optional[str]:
+    """Trafilatura main content of the page"""
+    tree = parse_tree(raw, encoding)
+    if tree is None:
+        return None
+    import trafilatura
+    return trafilatura.extract(
+        tree,
+        include_comments=False,
+        include_tables=True,
+        # No deduplicate=True: its seen-text cache is process-wide, so after a
+        # couple of extractions of the same page (or site template) it strips
+        # everything and we'd report "Failed to extract page content"
+    )
+
+def extract_article(raw: bytes, encoding: Optional[str] = None) -> Tuple[Optional[str], Optional[str]]:
+    """Return (text, title) for the generic extractor, sharing one parse between both calls"""
+    tree = parse_tree(raw, encoding)
+    if tree is None:
+        return None, None
+    import trafilatura
+    text = trafilatura.extract(tree, include_comments=False, include_tables=False)
+    metadata = trafilatura.extract_metadata(tree)
+    return text, metadata.title if metadata else None
+
+class FetchTrace:
+    """httpcore trace hook recording connect / TLS / time-to-first-byte per fetch.
+
+    httpcore resolves DNS inside connect_tcp, so "connect" is DNS + TCP. Reused
+    keep-alive connections only report ttfb and download.
+    """
+
+    def __init__(self):
+        self._started = {}
+        self.request_started = time.perf_counter()
+        self.headers_at = self.request_started
+
+    async def __call__(self, event_name: str, info: Dict[str, Any]):
+        if event_name.endswith(".started"):
+            self._started[event_name[:-8]] = time.perf_counter()
+        elif event_name.endswith(".complete"):
+            step = event_name[:-9]
+            started = self._started.pop(step, None)
+            if started is None:
+                return
+            if step == "connection.connect_tcp":
+                FETCH_SECONDS.observe(time.perf_counter() - started, "connect")
+            elif step == "connection.start_tls":
+                FETCH_SECONDS.observe(time.perf_counter() - started, "tls")
+
+    def headers_received(self):
+        FETCH_SECONDS.observe(time.perf_counter() - self.request_started, "ttfb")
+        self.headers_at = time.perf_counter()
+
+    def body_received(self):
+        FETCH_SECONDS.observe(time.perf_counter() - self.headers_at, "download")
+
+class PageDocument:
+    """A page fetched once per request and shared by every extraction strategy.
+
+    JSON-LD blocks are picked out of the byte stream while it downloads. The
+    decoded text and trafilatura main content are computed on first use and
+    cached on the object; trafilatura runs in the extraction pool.
+    """
+
+    def __init__(self, url: str, raw: bytes, encoding: Optional[str] = None, headers: Optional[Dict[str, str]] = None):
+        self.url = url
+        self.raw = raw
+        self.encoding = encoding
+        self.headers = headers or {}
+        self.json_ld = []  # Every JSON-LD block that parsed as JSON
+        self.recipe_node = None  # First schema.org Recipe found in json_ld
+        self.truncated = False  # True if the download stopped early at the Recipe
+        self._text = None
+        self._main_content = None
+        self._main_content_done = False
+
+    @classmethod
+    async def fetch(
+        cls,
+        url: str,
+        etag: Optional[str] = None,
+        last_modified: Optional[str] = None,
+        stop_at_recipe: bool = False,
+    ) -> Optional["PageDocument"]:
+        """GET the page, scanning for JSON-LD as the bytes arrive.
+
+        With validators this is a conditional GET that returns None on 304 Not
+        Modified. With stop_at_recipe the download is cut short as soon as a
+        Recipe node has been seen (most sites put it in <head>).
+        """
+        headers = dict(DEFAULT_HEADERS)
+        if etag:
+            headers['If-None-Match'] = etag
+        if last_modified:
+            headers['If-Modified-Since'] = last_modified
+        with stage("fetch"):
+            trace = FetchTrace()
+            async with get_http_client().stream("GET", url, headers=headers, extensions={"trace": trace}) as response:
+                trace.headers_received()
+                if response.status_code == 304 and (etag or last_modified):
+                    return None
+                response.raise_for_status()
+                scanner = JsonLdScanner()
+                chunks = []
+                truncated = False
+                scan_time = 0.0
+                async for chunk in response.aiter_bytes():
+                    chunks.append(chunk)
+                    scan_start = time.perf_counter()
+                    found = scanner.feed(chunk)
+                    scan_time += time.perf_counter() - scan_start
+                    if found and stop_at_recipe:
+                        truncated = True
+                        break
+                trace.body_received()
+                STAGE_SECONDS.observe(scan_time, "jsonld_scan")
+                record("jsonld_scan", scan_time)
+                doc = cls(url, b''.join(chunks), response.charset_encoding, dict(response.headers))
+        doc.json_ld = scanner.blocks
+        doc.recipe_node = scanner.recipe
+        doc.truncated = truncated
+        return doc
+
+    async def ensure_complete(self) -> "PageDocument":
+        """The full page, re-downloading it if the first fetch stopped early"""
+        if not self.truncated:
+            return self
+        return await PageDocument.fetch(self.url)
+
+    @property
+    def etag(self) -> Optional[str]:
+        return self.headers.get('etag')
+
+    @property
+    def last_modified(self) -> Optional[str]:
+        return self.headers.get('last-modified')
+
+    @property
+    def text(self) -> str:
+        """Decoded HTML"""
+        if self._text is None:
+            try:
+                self._text = self.raw.decode(self.encoding or 'utf-8', errors='replace')
+            except LookupError:
+                self._text = self.raw.decode('utf-8', errors='replace')
+        return self._text
+
+    async def get_main_content(self) -> Optional[str]:
+        """Main page text extracted by trafilatura"""
+        if not self._main_content_done:
+            with STAGE_SECONDS.time("trafilatura"):
+                self._main_content = await run_in_pool(extract_main_content, self.raw, self.encoding)
+            self._main_content_done = True
+        return self._main_content
@@ -1,17 +1,20 @@
-import requests
-import trafilatura
+from typing import Optional
 from ..models.extractor_models import ExtractionResponse
+from .document import PageDocument, extract_article
+from ..services.cpu_pool import run_in_pool
+from ..services.metrics import STAGE_SECONDS
 
 class ExtractorAgent:
-    def run(self, url: str) -> ExtractionResponse:
-        # 1. Fetch
-        response = requests.get(url, timeout=10)
-        response.raise_for_status() # Raise an exception for bad status codes
+    async def run(self, url: str, doc: Optional[PageDocument] = None) -> ExtractionResponse:
+        # 1. Fetch (raises for bad status codes), unless the caller already did
+        if doc is None:
+            doc = await PageDocument.fetch(url)
 
         # 2. Clean & Parse
-        # Trafilatura is the core library. It does the heavy lifting.
-        extracted_text = trafilatura.extract(response.content, include_comments=False, include_tables=False)
-        extracted_title = trafilatura.extract_metadata(response.content).title
+        # Trafilatura is the core library. It does the heavy lifting,
+        # in the extraction pool so it doesn't block the event loop.
+        with STAGE_SECONDS.time("trafilatura"):
+            extracted_text, extracted_title = await run_in_pool(extract_article, doc.raw, doc.encoding)
 
         if not extracted_text:
             raise ValueError("Failed to extract meaningful content from URL.")
@@ -22,4 +25,4 @@ class ExtractorAgent:
             url=url,
             title=extracted_title,
             text_content=extracted_text
-        )
\ No newline at end of file
+        )
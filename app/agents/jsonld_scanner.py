@@ -0,0 +1,105 @@
+import json
+import re
+from typing import Any, Dict, List, Optional
+
+# Byte-level patterns, so we can scan the response while it is still downloading
+SCRIPT_OPEN = re.compile(rb'<script\b([^>]*)>', re.IGNORECASE)
+SCRIPT_CLOSE = re.compile(rb'</script\s*>', re.IGNORECASE)
+LD_JSON_TYPE = re.compile(rb'''\btype\s*=\s*["']?\s*application/ld\+json''', re.IGNORECASE)
+CLOSE_TAG_TAIL = len(b'</script >')
+
+def find_recipe_node(data: Any) -> Optional[Dict]:
+    """Find the first schema.org Recipe in a JSON-LD value (arrays, @graph and mainEntity included)"""
+    if isinstance(data, list):
+        for item in data:
+            found = find_recipe_node(item)
+            if found:
+                return found
+    elif isinstance(data, dict):
+        types = data.get('@type')
+        if not isinstance(types, list):
+            types = [types]
+        if any(isinstance(t, str) and (t == 'Recipe' or t.endswith('/Recipe')) for t in types):
+            return data
+        for key in ('@graph', 'mainEntity'):
+            if key in data:
+                found = find_recipe_node(data[key])
+                if found:
+                    return found
+    return None
+
+def parse_block(body: bytes) -> Optional[Any]:
+    """Parse one <script type="application/ld+json"> body, tolerating the usual CMS wrappers"""
+    text = body.decode('utf-8', errors='replace').strip()
+    for prefix, suffix in (('<!--', '-->'), ('//<![CDATA[', '//]]>'), ('<![CDATA[', ']]>')):
+        if text.startswith(prefix) and text.endswith(suffix):
+            text = text[len(prefix):-len(suffix)].strip()
+    try:
+        # strict=False accepts raw newlines inside strings, which a lot of sites emit
+        return json.loads(text, strict=False)
+    except ValueError:
+        return None
+
+class JsonLdScanner:
+    """Incremental JSON-LD finder fed with raw response chunks.
+
+    Only the bytes of an unfinished <script> tag are buffered, so memory stays
+    small however large the page is. feed() returns True once a Recipe node has
+    been seen, which lets the caller stop downloading the rest of the page.
+    """
+
+    def __init__(self):
+        self.blocks = []
+        self.recipe = None
+        self._buf = bytearray()
+        self._pos = 0  # Where the next search starts, relative to _buf
+        self._body_start = None  # Start of the current <script> body, if inside one
+        self._is_ld = False
+
+    def feed(self, chunk: bytes) -> bool:
+        self._buf += chunk
+        while True:
+            if self._body_start is None:
+                match = SCRIPT_OPEN.search(self._buf, self._pos)
+                if not match:
+                    # Keep a possible partial '<script ...' at the end for the next chunk
+                    lt = self._buf.rfind(b'<', self._pos)
+                    self._compact(lt if lt >= 0 else len(self._buf))
+                    break
+                self._is_ld = bool(LD_JSON_TYPE.search(match.group(1)))
+                self._body_start = self._pos = match.end()
+            else:
+                match = SCRIPT_CLOSE.search(self._buf, self._pos)
+                if not match:
+                    # A partial '</script>' can straddle the chunk boundary
+                    self._pos = max(self._body_start, len(self._buf) - CLOSE_TAG_TAIL)
+                    if not self._is_ld:
+                        self._compact(self._pos)
+                    break
+                if self._is_ld:
+                    self._add_block(bytes(self._buf[self._body_start:match.start()]))
+                self._body_start = None
+                self._pos = match.end()
+        return self.recipe is not None
+
+    def _add_block(self, body: bytes):
+        data = parse_block(body)
+        if data is None:
+            return
+        self.blocks.append(data)
+        if self.recipe is None:
+            self.recipe = find_recipe_node(data)
+
+    def _compact(self, cut: int):
+        if cut <= 0:
+            return
+        del self._buf[:cut]
+        self._pos = max(self._pos - cut, 0)
+        if self._body_start is not None:
+            self._body_start = max(self._body_start - cut, 0)
+
+def scan_json_ld(raw: bytes) -> List[Any]:
+    """Every JSON-LD block in a complete page"""
+    scanner = JsonLdScanner()
+    scanner.feed(raw)
+    return scanner.blocks
@@ -0,0 +1,143 @@
+import math
+import os
+import re
+from typing import List
+
+# Content tokens sent to the LLM per extraction (the old 4000-char cut was ~1000)
+PROMPT_CONTENT_TOKEN_BUDGET = int(os.getenv("PROMPT_CONTENT_TOKEN_BUDGET", "900"))
+# With fewer recipe-looking lines than this we can't tell where the recipe is,
+# so the budget is filled with the page in reading order instead
+MIN_RECIPE_LINES = 4
+# Lines scoring below this are left out even when the budget has room
+MIN_LINE_SCORE = 2
+
+# Identical for every call, with only the page content at the end varying.
+# At ~250 tokens it's well under the ~1024-token minimum before Anthropic or
+# OpenAI will cache a prompt prefix, and padding it past that would cost more
+# per call than the cache saves, so don't count on prompt caching here.
+RECIPE_PROMPT_PREFIX = """Extract the recipe from the content below and return ONLY valid JSON matching this exact structure:
+{
+  "title": "Recipe Title",
+  "description": "Brief description or null",
+  "ingredients": [
+    {"amount": "2", "unit": "cups", "item": "flour", "notes": "sifted"},
+    {"amount": null, "unit": null, "item": "Salt to taste", "notes": null}
+  ],
+  "instructions": [
+    "Step 1 text",
+    "Step 2 text"
+  ],
+  "prep_time_minutes": 15,
+  "cook_time_minutes": 30,
+  "total_time_minutes": 45,
+  "servings": 4,
+  "cuisine": "Italian",
+  "course": "main",
+  "difficulty": "easy",
+  "calories_per_serving": 350,
+  "author": "Author Name"
+}
+
+Return ONLY the JSON object, no other text. Lines marked [...] were left out of the page.
+
+Content to extract from:
+"""
+
+# Rough BPE token count: words, short digit runs and punctuation are ~1 token each
+_TOKEN_PIECE_RE = re.compile(r"[^\W\d_]+|\d{1,3}|[^\w\s]")
+
+def estimate_tokens(text: str) -> int:
+    """Local estimate of the tokens an LLM tokenizer would produce (no tokenizer download needed)"""
+    tokens = 0
+    for piece in _TOKEN_PIECE_RE.findall(text):
+        # Long words split into several BPE tokens
+        tokens += 1 if len(piece) <= 6 else math.ceil(len(piece) / 6)
+    return tokens
+
+_QUANTITY_RE = re.compile(r"^\s*(?:[-*•▪]\s*)?(?:\d+(?:[./]\d+)?|[¼-¾⅐-⅞]|a|an|one|two|three|half)\b", re.IGNORECASE)
+_UNIT_RE = re.compile(
+    r"\b(?:cups?|tbsps?|tsps?|tablespoons?|teaspoons?|oz|ounces?|lbs?|pounds?|grams?|g|kg|ml|l|liters?|litres?|"
+    r"pinch|dash|cloves?|cans?|sticks?|slices?|packages?|large|medium|small|whole)\b",
+    re.IGNORECASE
+)
+_STEP_RE = re.compile(
+    r"^\s*(?:step\s*\d+|\d+[.)])|^\s*(?:preheat|heat|whisk|stir|mix|combine|add|pour|bake|cook|simmer|boil|roast|"
+    r"fry|saute|sauté|place|season|serve|remove|transfer|let|cover|bring|chop|slice|cut|fold|beat|spread|drain|grill|reduce)\b",
+    re.IGNORECASE
+)
+_META_RE = re.compile(r"\b(?:prep|cook|total|active)\s*time\b|\bservings?\b|\bserves\b|\byield\b|\bmakes\b|\bcalories\b", re.IGNORECASE)
+_HEADING_RE = re.compile(r"^\s*(?:ingredients?|instructions?|directions?|method|preparation|steps|for the \w+)\s*:?\s*$", re.IGNORECASE)
+_NOISE_RE = re.compile(r"\b(?:comments?|reply|subscribe|newsletter|sign up|privacy|cookie|advertisement|affiliate|rate this)\b", re.IGNORECASE)
+
+def _score_line(line: str) -> float:
+    if _HEADING_RE.match(line):
+        return 4
+    score = 0.0
+    if _QUANTITY_RE.match(line) and len(line) < 120:
+        score += 2 + (1 if _UNIT_RE.search(line) else 0)
+    if _STEP_RE.match(line) and len(line) < 300:
+        # Numbered steps are a strong signal, a leading cooking verb a weak one
+        # (blog prose starts with "Stir-fried..." too)
+        score += 2 if line.lstrip()[:1].isdigit() or line.lstrip().lower().startswith("step") else 1.5
+    if _META_RE.search(line) and len(line) < 160:
+        score += 3
+    if _NOISE_RE.search(line):
+        score -= 3
+    return score
+
+def select_recipe_regions(content: str, budget: int = PROMPT_CONTENT_TOKEN_BUDGET) -> str:
+    """The recipe-bearing lines of trafilatura output that fit in `budget` tokens, in page order.
+
+    Ingredient lists, numbered or imperative steps, time/yield lines and the
+    sections under Ingredients/Instructions headings score highest; blog
+    preamble and comments score nothing and are dropped even when they would
+    fit. The title (first line) is always kept.
+    """
+    lines = [line.strip() for line in content.split("\n") if line.strip()]
+    if not lines:
+        return ""
+    scores = [_score_line(line) for line in lines]
+
+    # Lines under an Ingredients/Instructions heading belong to the recipe even
+    # when they don't look like it on their own (e.g. "Salt and pepper")
+    in_section = False
+    for i, line in enumerate(lines):
+        if _HEADING_RE.match(line):
+            in_section = True
+        elif in_section:
+            if len(line) > 300 or scores[i] < 0:
+                in_section = False  # Back to prose or comments
+            else:
+                scores[i] += 1.5
+    # A short line next to recipe lines is probably recipe too (not the story right above "Ingredients")
+    smoothed = [
+        s + 0.5 * max(scores[i - 1] if i > 0 else 0, scores[i + 1] if i + 1 < len(scores) else 0, 0)
+        if len(lines[i]) < 300 else s
+        for i, s in enumerate(scores)
+    ]
+
+    costs = [estimate_tokens(line) + 1 for line in lines]  # +1 for the newline
+    keep = {0}
+    used = costs[0]
+    recipe_lines = [i for i in sorted(range(1, len(lines)), key=lambda i: (-smoothed[i], i)) if smoothed[i] >= MIN_LINE_SCORE]
+    for i in recipe_lines:
+        if used + costs[i] <= budget:
+            keep.add(i)
+            used += costs[i]
+    if len(recipe_lines) < MIN_RECIPE_LINES:
+        # No clear recipe region; fill the budget in reading order like a plain cut would
+        for i in range(1, len(lines)):
+            if i not in keep and used + costs[i] <= budget:
+                keep.add(i)
+                used += costs[i]
+
+    out: List[str] = []
+    previous = -1
+    for i in sorted(keep):
+        if i != previous + 1:
+            out.append("[...]")
+        out.append(lines[i])
+        previous = i
+    if previous != len(lines) - 1:
+        out.append("[...]")
+    return "\n".join(out)
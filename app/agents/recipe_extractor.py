@@ -1,14 +1,57 @@
-import os
 import json
+import math
+import os
+import re
 import time
-import requests
-from typing import Dict, Any, Optional, List
+from functools import lru_cache
+from typing import Dict, Any, AsyncIterator, Optional, List, Tuple
 from ..models.recipe_models import RecipeData, Ingredient, RecipeResponse
-import trafilatura
+from .document import PageDocument
+from .prompt_builder import RECIPE_PROMPT_PREFIX, select_recipe_regions
+from ..services.cpu_pool import PoolSaturated
+from ..services.fingerprint_cache import lookup_extraction, store_extraction
+from ..services.llm_client import LLMResult, call_claude, call_openai
+from ..services.server_timing import stage
+from ..services.strategy_memory import StrategyPlan, get_strategy_memory
 from dotenv import load_dotenv
 
 load_dotenv()
 
+# ISO-8601 durations as schema.org uses them: PT15M, PT1H30M, P0DT0H45M, PT90S, P1DT2H
+ISO_DURATION_RE = re.compile(
+    r'\s*P(?:(\d+(?:\.\d+)?)D)?(?:T(?:(\d+(?:\.\d+)?)H)?(?:(\d+(?:\.\d+)?)M)?(?:(\d+(?:\.\d+)?)S)?)?\s*',
+    re.IGNORECASE
+)
+FIRST_NUMBER_RE = re.compile(r'\d+')
+
+@lru_cache(maxsize=4096)
+def _iso_duration_minutes(duration_str: str) -> Optional[int]:
+    match = ISO_DURATION_RE.fullmatch(duration_str)
+    if match is None:
+        return None
+    days, hours, minutes, seconds = match.groups()
+    if days is None and hours is None and minutes is None and seconds is None:
+        return None  # Bare "P" or "PT"
+    total = 0.0
+    if days:
+        total += float(days) * 1440
+    if hours:
+        total += float(hours) * 60
+    if minutes:
+        total += float(minutes)
+    if seconds:
+        total += float(seconds) / 60
+    return math.ceil(total)  # Round up, so PT30S isn't 0 and PT90S is 2
+
+def parse_duration(duration_str) -> Optional[int]:
+    """ISO-8601 duration to whole minutes, rounded up (PT1H30M -> 90, PT30S -> 1), None if it isn't one.
+
+    Sites reuse a handful of values (PT10M, PT1H...), so results are memoized.
+    """
+    if not duration_str or not isinstance(duration_str, str):
+        return None
+    return _iso_duration_minutes(duration_str)
+
 class RecipeExtractorAgent:
     """AI-powered recipe extraction agent with multiple fallback strategies"""
     
@@ -18,15 +61,46 @@ class RecipeExtractorAgent:
         self.openai_api_key = os.getenv("OPENAI_API_KEY")
         self.use_ai = bool(self.claude_api_key or self.openai_api_key)
         
-    def run(self, url: str, prefer_fast: bool = True) -> RecipeResponse:
-        """Extract recipe from URL using best available method"""
+    async def run(self, url: str, prefer_fast: bool = True, doc: Optional[PageDocument] = None) -> RecipeResponse:
+        """Extract recipe from URL using best available method (doc skips the fetch if already downloaded)"""
+        result = None
+        async for result in self.run_progressive(url, prefer_fast, doc):
+            pass
+        return result
+    
+    async def run_progressive(
+        self,
+        url: str,
+        prefer_fast: bool = True,
+        doc: Optional[PageDocument] = None,
+        plan: Optional[StrategyPlan] = None
+    ) -> AsyncIterator[RecipeResponse]:
+        """Same chain as run(), yielding a result as each stage finishes.
+
+        Structured data ends it right away. Otherwise the basic extraction is
+        yielded as a draft the moment the page text is ready, then the AI
+        result if it succeeds. The last result yielded is the one run() returns.
+        plan (per-host, from the strategy memory) may skip the LLM or pick its provider.
+        """
         start_time = time.time()
+        memory = get_strategy_memory()
+        if plan is None:
+            plan = memory.plan(url)
         
         try:
-            # 1. Try structured data extraction first (fastest, free)
-            structured_recipe = self._extract_structured_data(url)
+            # 1. Fetch the page once; every strategy below reads from this document
+            if doc is None:
+                doc = await self._fetch_document(url, stop_at_recipe=plan.stop_at_recipe)
+            if doc is None:
+                raise ValueError("Failed to fetch page content")
+            
+            # 2. Try structured data extraction first (fastest, free). The JSON-LD
+            # scan ran during the download anyway, so this is tried on every host
+            with stage("structured"):
+                structured_recipe = self._extract_structured_data(doc)
+            memory.record(url, "structured", structured_recipe is not None)
             if structured_recipe:
-                return RecipeResponse(
+                yield RecipeResponse(
                     status="success",
                     recipe=structured_recipe,
                     extraction_method="structured_data",
@@ -34,21 +108,19 @@ class RecipeExtractorAgent:
                     extraction_time_ms=int((time.time() - start_time) * 1000),
                     cost_cents=0
                 )
+                return
             
-            # 2. Fetch page content
-            page_content = self._fetch_page_content(url)
+            # 3. Clean page content (the download may have stopped early at a Recipe we couldn't use)
+            with stage("content"):
+                doc = await doc.ensure_complete()
+                page_content = await doc.get_main_content()
             if not page_content:
-                raise ValueError("Failed to fetch page content")
-            
-            # 3. Try AI extraction if available
-            if self.use_ai:
-                ai_recipe = self._extract_with_ai(page_content, url, prefer_fast)
-                if ai_recipe:
-                    return ai_recipe
+                raise ValueError("Failed to extract page content")
             
-            # 4. Fallback to basic extraction
-            basic_recipe = self._extract_basic(page_content, url)
-            return RecipeResponse(
+            # 4. Basic extraction: the fallback, and a usable draft while the AI works (it takes well under a ms)
+            with stage("basic"):
+                basic_recipe = self._extract_basic(page_content, url)
+            yield RecipeResponse(
                 status="success",
                 recipe=basic_recipe,
                 extraction_method="fallback",
@@ -57,8 +129,17 @@ class RecipeExtractorAgent:
                 cost_cents=0
             )
             
+            # 5. Refine with AI if available, unless the LLM keeps failing on this host
+            if self.use_ai and plan.use_ai:
+                with stage("ai"):
+                    ai_recipe = await self._extract_with_ai(page_content, url, prefer_fast, start_time, plan.providers)
+                if ai_recipe:
+                    yield ai_recipe
+            
+        except PoolSaturated:
+            raise  # Backpressure, let the endpoint turn it into a 503
         except Exception as e:
-            return RecipeResponse(
+            yield RecipeResponse(
                 status="error",
                 extraction_method="none",
                 confidence_score=0,
@@ -66,55 +147,20 @@ class RecipeExtractorAgent:
                 error=str(e)
             )
     
-    def _fetch_page_content(self, url: str) -> Optional[str]:
-        """Fetch and clean page content"""
+    async def _fetch_document(self, url: str, stop_at_recipe: bool = True) -> Optional[PageDocument]:
+        """Download the page a single time for all strategies"""
         try:
-            response = requests.get(url, timeout=10, headers={
-                'User-Agent': 'Mozilla/5.0 (compatible; RecipeBot/1.0)'
-            })
-            response.raise_for_status()
-            
-            # Extract main content using trafilatura
-            content = trafilatura.extract(
-                response.content,
-                include_comments=False,
-                include_tables=True,
-                deduplicate=True
-            )
-            
-            # Also get the raw HTML for structured data extraction
-            self._raw_html = response.text
-            return content
-            
+            return await PageDocument.fetch(url, stop_at_recipe=stop_at_recipe)
         except Exception as e:
             print(f"Error fetching {url}: {e}")
             return None
     
-    def _extract_structured_data(self, url: str) -> Optional[RecipeData]:
+    def _extract_structured_data(self, doc: PageDocument) -> Optional[RecipeData]:
         """Extract recipe from JSON-LD structured data (Pinterest often has this)"""
         try:
-            response = requests.get(url, timeout=10)
-            response.raise_for_status()
-            html = response.text
-            
-            # Look for Recipe schema.org JSON-LD
-            import re
-            json_ld_pattern = r'<script[^>]*type="application/ld\+json"[^>]*>(.*?)</script>'
-            matches = re.findall(json_ld_pattern, html, re.DOTALL)
-            
-            for match in matches:
-                try:
-                    data = json.loads(match)
-                    
-                    # Handle both single recipe and array of items
-                    recipes = [data] if isinstance(data, dict) else data
-                    
-                    for item in recipes:
-                        if item.get('@type') == 'Recipe' or 'Recipe' in str(item.get('@type', '')):
-                            return self._parse_schema_recipe(item, url)
-                            
-                except json.JSONDecodeError:
-                    continue
+            # The scanner already walked arrays, @graph wrappers and every block on the page
+            if doc.recipe_node:
+                return self._parse_schema_recipe(doc.recipe_node, doc.url)
                     
         except Exception as e:
             print(f"Structured data extraction failed: {e}")
@@ -146,20 +192,6 @@ class RecipeExtractorAgent:
                 text = inst.get('text') or inst.get('name') or str(inst)
                 instructions.append(text)
         
-        # Parse times (convert ISO duration to minutes)
-        def parse_duration(duration_str):
-            if not duration_str:
-                return None
-            # Simple parsing for PT15M format
-            import re
-            match = re.search(r'PT(\d+)M', duration_str)
-            if match:
-                return int(match.group(1))
-            match = re.search(r'PT(\d+)H', duration_str)
-            if match:
-                return int(match.group(1)) * 60
-            return None
-        
         # Get nutrition info
         nutrition = data.get('nutrition', {})
         calories = None
@@ -207,8 +239,7 @@ class RecipeExtractorAgent:
             return yield_value
         if isinstance(yield_value, str):
             # Extract first number from string like "4 servings" or "Serves 6"
-            import re
-            match = re.search(r'\d+', yield_value)
+            match = FIRST_NUMBER_RE.search(yield_value)
             if match:
                 return int(match.group())
         return None
@@ -223,48 +254,52 @@ class RecipeExtractorAgent:
             return author_data.get('name')
         return None
     
-    def _extract_with_ai(self, content: str, url: str, prefer_fast: bool) -> Optional[RecipeResponse]:
-        """Extract recipe using AI (Claude or OpenAI)"""
-        start_time = time.time()
+    def _pick_provider(self, prefer_fast: bool, preferred: Tuple[str, ...] = ()) -> Optional[str]:
+        """The planned provider if we have its key, else Claude unless prefer_fast and OpenAI is set up"""
+        keys = {"claude": self.claude_api_key, "openai": self.openai_api_key}
+        for provider in preferred:
+            if keys.get(provider):
+                return provider
+        if self.claude_api_key and (not prefer_fast or not self.openai_api_key):
+            return "claude"
+        return "openai" if self.openai_api_key else None
+    
+    async def _extract_with_ai(self, content: str, url: str, prefer_fast: bool, start_time: float, providers: Tuple[str, ...] = ()) -> Optional[RecipeResponse]:
+        """Extract recipe using AI (Claude or OpenAI). start_time is when run() began, so the
+        reported time covers the fetch and trafilatura too, not just the LLM call.
+        providers is the strategy plan's preference order for this host."""
         
-        prompt = f"""Extract the recipe from this content and return ONLY valid JSON matching this exact structure:
-{{
-  "title": "Recipe Title",
-  "description": "Brief description or null",
-  "ingredients": [
-    {{"amount": "2", "unit": "cups", "item": "flour", "notes": "sifted"}},
-    {{"amount": null, "unit": null, "item": "Salt to taste", "notes": null}}
-  ],
-  "instructions": [
-    "Step 1 text",
-    "Step 2 text"
-  ],
-  "prep_time_minutes": 15,
-  "cook_time_minutes": 30,
-  "total_time_minutes": 45,
-  "servings": 4,
-  "cuisine": "Italian",
-  "course": "main",
-  "difficulty": "easy",
-  "calories_per_serving": 350,
-  "author": "Author Name"
-}}
-
-Content to extract from:
-{content[:4000]}  # Limit to 4000 chars to save tokens
+        provider = None
+        llm_start = None
+        try:
+            # Only the recipe-bearing regions, within a token budget, behind a static prefix
+            regions = select_recipe_regions(content)
 
-Return ONLY the JSON object, no other text."""
+            # The same recipe text under another URL (pin, AMP page, syndicated copy) was already paid for
+            cache_key, cached_recipe = await lookup_extraction(regions)
+            if cached_recipe:
+                return RecipeResponse(
+                    status="success",
+                    recipe=RecipeData.model_validate({**json.loads(cached_recipe), "source_url": url}),
+                    extraction_method="ai",
+                    confidence_score=0.9,
+                    extraction_time_ms=int((time.time() - start_time) * 1000),
+                    cost_cents=0,
+                    cached=True
+                )
 
-        try:
-            if self.claude_api_key and (not prefer_fast or not self.openai_api_key):
-                response = self._call_claude(prompt)
-            elif self.openai_api_key:
-                response = self._call_openai(prompt, prefer_fast)
-            else:
+            prompt = RECIPE_PROMPT_PREFIX + regions
+            provider = self._pick_provider(prefer_fast, providers)
+            if provider is None:
                 return None
+            llm_start = time.perf_counter()
+            if provider == "claude":
+                response = await self._call_claude(prompt)
+            else:
+                response = await self._call_openai(prompt, prefer_fast)
             
-            # Parse the JSON response
-            recipe_dict = json.loads(response)
+            # The client already parsed the JSON object as it streamed in
+            recipe_dict = response.data
             
             # Convert to our model
             ingredients = [
@@ -288,13 +323,8 @@ Return ONLY the JSON object, no other text."""
                 author=recipe_dict.get('author'),
                 source_url=url
             )
-            
-            # Calculate cost (rough estimate)
-            tokens_used = len(prompt) / 4 + len(response) / 4  # Rough token estimate
-            if self.claude_api_key and not prefer_fast:
-                cost_cents = tokens_used * 0.003 / 1000 * 100  # Claude Haiku pricing
-            else:
-                cost_cents = tokens_used * 0.0005 / 1000 * 100  # GPT-3.5 pricing
+            get_strategy_memory().record(url, f"ai:{provider}", True, time.perf_counter() - llm_start, response.cost_cents)
+            await store_extraction(cache_key, recipe.model_dump_json(exclude={"source_url"}), url)
             
             return RecipeResponse(
                 status="success",
@@ -302,51 +332,23 @@ Return ONLY the JSON object, no other text."""
                 extraction_method="ai",
                 confidence_score=0.9,
                 extraction_time_ms=int((time.time() - start_time) * 1000),
-                cost_cents=cost_cents
+                cost_cents=response.cost_cents  # From the token usage the provider reported
             )
             
         except Exception as e:
             print(f"AI extraction failed: {e}")
+            if llm_start is not None:
+                # Failed calls still took time (and usually tokens, which we don't see here)
+                get_strategy_memory().record(url, f"ai:{provider}", False, time.perf_counter() - llm_start)
             return None
     
-    def _call_claude(self, prompt: str) -> str:
+    async def _call_claude(self, prompt: str) -> LLMResult:
         """Call Claude API for extraction"""
-        response = requests.post(
-            "https://api.anthropic.com/v1/messages",
-            headers={
-                "x-api-key": self.claude_api_key,
-                "anthropic-version": "2023-06-01",
-                "content-type": "application/json"
-            },
-            json={
-                "model": "claude-3-haiku-20240307",  # Cheapest, fastest
-                "max_tokens": 2000,
-                "messages": [{"role": "user", "content": prompt}]
-            }
-        )
-        response.raise_for_status()
-        return response.json()['content'][0]['text']
+        return await call_claude(self.claude_api_key, prompt, model="claude-3-haiku-20240307")  # Cheapest, fastest
     
-    def _call_openai(self, prompt: str, prefer_fast: bool) -> str:
+    async def _call_openai(self, prompt: str, prefer_fast: bool) -> LLMResult:
         """Call OpenAI API for extraction"""
-        response = requests.post(
-            "https://api.openai.com/v1/chat/completions",
-            headers={
-                "Authorization": f"Bearer {self.openai_api_key}",
-                "Content-Type": "application/json"
-            },
-            json={
-                "model": "gpt-3.5-turbo" if prefer_fast else "gpt-4o-mini",
-                "messages": [
-                    {"role": "system", "content": "You are a recipe extraction assistant. Return only valid JSON."},
-                    {"role": "user", "content": prompt}
-                ],
-                "max_tokens": 2000,
-                "temperature": 0.1
-            }
-        )
-        response.raise_for_status()
-        return response.json()['choices'][0]['message']['content']
+        return await call_openai(self.openai_api_key, prompt, model="gpt-3.5-turbo" if prefer_fast else "gpt-4o-mini")
     
     def _extract_basic(self, content: str, url: str) -> RecipeData:
         """Basic extraction without AI - last resort fallback"""
@@ -1,77 +1,184 @@
 # app/database.py
+import asyncio
+import fcntl
+import os
+import time
 import aiosqlite
+from .migrations import run_migrations
+from .services.metrics import DB_SECONDS
 
-DB_PATH = "/data/agentic_ledger.db"
-_db = None
+DB_PATH = os.getenv("DB_PATH", "/data/agentic_ledger.db")
+_db = None  # The single writer connection
+_readers = None  # asyncio.Queue of read-only connections
+
+# Read-only connections for status polls, credit checks and cache lookups, so
+# they don't queue behind writes on the writer's thread. 0 = share the writer.
+DB_READ_POOL_SIZE = int(os.getenv("DB_READ_POOL_SIZE", "4"))
+# Compiled statements kept per connection (we only use fixed, parameterized SQL)
+DB_STATEMENT_CACHE = int(os.getenv("DB_STATEMENT_CACHE", "256"))
+
+# Applied to every connection. WAL + synchronous=NORMAL only fsyncs at checkpoints,
+# which is still durable against process crashes.
+PRAGMA_PROFILE = (
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA busy_timeout=5000",
+    "PRAGMA cache_size=-65536",  # 64 MB page cache
+    "PRAGMA mmap_size=268435456",  # 256 MB memory-mapped reads
+    "PRAGMA temp_store=MEMORY",
+)
+
+# Write-behind settings for log/analytics rows (api_logs, recipe_extractions)
+LOG_FLUSH_INTERVAL_MS = int(os.getenv("LOG_FLUSH_INTERVAL_MS", "200"))
+LOG_FLUSH_MAX_ROWS = int(os.getenv("LOG_FLUSH_MAX_ROWS", "500"))
+LOG_QUEUE_MAX_ROWS = int(os.getenv("LOG_QUEUE_MAX_ROWS", "10000"))
+LOG_QUEUE_POLICY = os.getenv("LOG_QUEUE_POLICY", "drop")  # "drop" new rows when full, or "block" until there is room
+
+class WriteBehindQueue:
+    """Buffers non-critical INSERTs and group-commits them in one transaction.
+
+    Rows are flushed every LOG_FLUSH_INTERVAL_MS or as soon as LOG_FLUSH_MAX_ROWS
+    are waiting, so requests no longer pay an fsync each. Memory is bounded by
+    LOG_QUEUE_MAX_ROWS. Never use this for invoices or users.
+
+    It writes on its own connection, so a failed batch can be rolled back
+    without touching whatever other tasks have pending on the shared writer.
+    """
+
+    def __init__(self, db: aiosqlite.Connection):
+        self.db = db
+        self.dropped = 0
+        self.flushed = 0
+        self._rows = {}  # sql -> list of params
+        self._pending = 0
+        self._wake = asyncio.Event()
+        self._room = asyncio.Event()
+        self._room.set()
+        self._task = None
+        self._closing = False
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def enqueue(self, sql: str, params: tuple):
+        while self._pending >= LOG_QUEUE_MAX_ROWS:
+            if LOG_QUEUE_POLICY != "block" or self._closing:
+                self.dropped += 1
+                return
+            self._room.clear()
+            await self._room.wait()
+        self._rows.setdefault(sql, []).append(params)
+        self._pending += 1
+        if self._pending >= LOG_FLUSH_MAX_ROWS:
+            self._wake.set()
+
+    async def _run(self):
+        while not self._closing:
+            try:
+                await asyncio.wait_for(self._wake.wait(), LOG_FLUSH_INTERVAL_MS / 1000)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            await self.flush()
+
+    async def flush(self):
+        if not self._pending:
+            return
+        rows, self._rows = self._rows, {}
+        count, self._pending = self._pending, 0
+        self._room.set()
+        try:
+            with DB_SECONDS.time("write_batch"):
+                for sql, params in rows.items():
+                    await self.db.executemany(sql, params)
+                await self.db.commit()
+            self.flushed += count
+        except Exception as e:
+            self.dropped += count
+            print(f"Write-behind flush of {count} rows failed: {e}")
+            # Don't leave half a batch open for the next flush to commit
+            try:
+                await self.db.rollback()
+            except Exception as rollback_error:
+                print(f"Write-behind rollback failed: {rollback_error}")
+
+    async def close(self):
+        self._closing = True
+        self._wake.set()
+        self._room.set()
+        if self._task:
+            await self._task
+        await self.flush()
+        await self.db.close()
+
+_writer = None
+
+async def enqueue_write(sql: str, params: tuple):
+    """Queue a log/analytics INSERT for the next group commit"""
+    if _writer is None: raise RuntimeError("Database not initialized.")
+    await _writer.enqueue(sql, params)
 
 async def get_db():
     global _db
     if _db is None: raise RuntimeError("Database not initialized.")
     return _db
 
+class read_connection:
+    """async with read_connection() as conn: ... (falls back to the writer without a pool)"""
+
+    async def __aenter__(self) -> aiosqlite.Connection:
+        self.start = time.perf_counter()
+        if _readers is None:
+            self.conn = None
+            return await get_db()
+        self.conn = await _readers.get()
+        return self.conn
+
+    async def __aexit__(self, *exc):
+        if self.conn is not None:
+            _readers.put_nowait(self.conn)
+        DB_SECONDS.observe(time.perf_counter() - self.start, "read")
+
+async def _open(uri: str) -> aiosqlite.Connection:
+    conn = await aiosqlite.connect(uri, uri=True, cached_statements=DB_STATEMENT_CACHE)
+    for pragma in PRAGMA_PROFILE:
+        await conn.execute(pragma)
+    return conn
+
 async def connect_to_db():
-    global _db
-    _db = await aiosqlite.connect(DB_PATH)
-    await _db.execute("PRAGMA journal_mode=WAL;") # Better concurrency
+    global _db, _writer, _readers
+    _db = await _open(f"file:{DB_PATH}")
+    # Workers starting together would race to apply the same migration (and
+    # VACUUM can't run inside a transaction to guard it), so they take turns
+    # on a lock file; the later ones find user_version already current.
+    with open(f"{DB_PATH}.migrate.lock", "w") as lock:
+        await asyncio.to_thread(fcntl.flock, lock, fcntl.LOCK_EX)
+        await _db.execute("PRAGMA journal_mode=WAL;") # Better concurrency
+        
+        # Schema lives in app/migrations.py, tracked with PRAGMA user_version
+        await run_migrations(_db)
+        
+        await _db.commit()
+    _writer = WriteBehindQueue(await _open(f"file:{DB_PATH}"))
+    _writer.start()
     
-    await _db.execute("""
-        CREATE TABLE IF NOT EXISTS invoices (
-            payment_hash TEXT PRIMARY KEY,
-            status TEXT NOT NULL DEFAULT 'pending', -- pending, settled, expired
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    """)
-    
-    # Initialize the used_invoices table
-    await _db.execute("""
-        CREATE TABLE IF NOT EXISTS used_invoices (
-            payment_hash TEXT PRIMARY KEY,
-            used_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    """)
-    
-    # Add recipe-specific tables
-    await _db.execute("""
-        CREATE TABLE IF NOT EXISTS users (
-            token TEXT PRIMARY KEY,
-            email TEXT,
-            recipes_remaining INTEGER DEFAULT 3,
-            subscription_type TEXT DEFAULT 'free', -- free, monthly, payperuse
-            stripe_customer_id TEXT,
-            stripe_subscription_id TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    """)
-    
-    await _db.execute("""
-        CREATE TABLE IF NOT EXISTS recipe_extractions (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            url TEXT NOT NULL,
-            user_token TEXT,
-            extraction_method TEXT,
-            confidence_score REAL,
-            cost_cents REAL,
-            extracted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    """)
-    
-    await _db.execute("""
-        CREATE TABLE IF NOT EXISTS api_logs (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            endpoint TEXT,
-            status_code INTEGER,
-            payment_hash TEXT,
-            url_requested TEXT,
-            error_message TEXT,
-            logged_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    """)
-    
-    await _db.commit()
-    print("--- Database connection established and tables initialized ---")
+    # Readers open after the schema exists; mode=ro can't create tables
+    if DB_READ_POOL_SIZE > 0:
+        _readers = asyncio.Queue()
+        for _ in range(DB_READ_POOL_SIZE):
+            _readers.put_nowait(await _open(f"file:{DB_PATH}?mode=ro"))
+    print(f"--- Database connection established and tables initialized ({DB_READ_POOL_SIZE} readers) ---")
 
 async def close_db():
-    global _db
+    global _db, _writer, _readers
+    if _writer:
+        # Flush buffered log rows and close the queue's connection
+        await _writer.close()
+        print(f"--- Write-behind queue flushed ({_writer.flushed} rows written, {_writer.dropped} dropped) ---")
+        _writer = None
+    if _readers:
+        while not _readers.empty():
+            await _readers.get_nowait().close()
+        _readers = None
     if _db:
         await _db.close()
         _db = None
@@ -1,15 +1,35 @@
-import jwt
+import json
+import os
+import hmac
 import time
-from fastapi import FastAPI, HTTPException, Depends, Request
+import asyncio
+from typing import Callable, Optional
+from fastapi import FastAPI, HTTPException, Depends, Request, Header
+from fastapi.responses import StreamingResponse, PlainTextResponse, FileResponse
 from .models.extractor_models import InvoiceRequest, InvoiceResponse, ExtractionRequest, ExtractionResponse
-from .models.recipe_models import RecipeRequest, RecipeResponse, UserSubscription
+from .models.recipe_models import RecipeRequest, RecipeResponse, UserSubscription, BatchRecipeRequest, BatchRecipeItem
+from .models.admin_models import ProfilingRequest
 from .agents.extractor import ExtractorAgent
 from .agents.recipe_extractor import RecipeExtractorAgent
-from .services.alby_client import AlbyClient, WEBHOOK_SECRET
-from pydantic import BaseModel # <<< ADD THIS LINE
-from .database import get_db, connect_to_db, close_db  # Import new functions
+from .services.alby_client import WEBHOOK_SECRET, check_alby_config
+from pydantic import BaseModel, HttpUrl # <<< ADD THIS LINE
+from .database import get_db, read_connection, connect_to_db, close_db, enqueue_write  # Import new functions
+from .services.http_client import start_http_client, close_http_client
+from .services.result_cache import run_cached, canonicalize_url
+from .services.single_flight import get_single_flight, single_flight_stats
+from .services.batch import fan_out
+from .services.retention import start_retention_job, stop_retention_job
+from .services.credits import charge_recipes, refund_recipes, FREE_TIER_RECIPES
+from .services.invoice_events import get_invoice_events
+from .services.invoice_pool import start_invoice_pool, close_invoice_pool, get_invoice_pool
+from .services.webhooks import verify_webhook, start_settlement_ingestor, close_settlement_ingestor, get_settlement_ingestor
+from .services.cpu_pool import start_cpu_pool, close_cpu_pool, pending_jobs, PoolSaturated
+from .services.metrics import register_collector, start_loop_lag_monitor, stop_loop_lag_monitor, DB_SECONDS, RECIPE_EXTRACTIONS, HTTP_REQUEST_SECONDS, STREAM_RESULT_SECONDS
+from .services.server_timing import start_request_timings, server_timing_header
+from .services.profiler import get_profiler, list_profiles, PROFILE_DIR
+from .services.strategy_memory import start_strategy_memory, close_strategy_memory, get_strategy_memory
+from .services.workers import start_worker_sync, close_worker_sync, get_worker_bus, render_host_metrics
 import aiosqlite
-from svix.webhooks import Webhook
 
 
 app = FastAPI(title="Agentic MVP")
@@ -17,21 +37,69 @@ app = FastAPI(title="Agentic MVP")
 # NEW: Use the correct lifespan events to manage our singleton connection
 @app.on_event("startup")
 async def startup_event():
+    check_alby_config()
+    start_agents()
     await connect_to_db()
+    await start_worker_sync()
+    await start_http_client()
+    await start_cpu_pool()
+    await start_retention_job()
+    await start_settlement_ingestor()
+    await start_invoice_pool()
+    await start_strategy_memory()
+    await start_loop_lag_monitor()
 
 @app.on_event("shutdown")
 async def shutdown_event():
+    await stop_loop_lag_monitor()
+    await close_strategy_memory()
+    await close_invoice_pool()
+    await close_settlement_ingestor()
+    await stop_retention_job()
+    await close_cpu_pool()
+    await close_http_client()
+    await close_worker_sync()
     await close_db()
 
-# Dependency Injection for our clients
-def get_alby_client():
-    return AlbyClient()
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    start = time.perf_counter()
+    timings = start_request_timings()
+    response = await call_next(request)
+    elapsed = time.perf_counter() - start
+    # Label by route template, not raw path, so payment hashes don't explode the series
+    route = request.scope.get("route")
+    HTTP_REQUEST_SECONDS.observe(
+        elapsed, request.method, route.path if route else "unmatched", str(response.status_code)
+    )
+    # Streaming responses send headers first, so they only show the stages done by then
+    response.headers["Server-Timing"] = server_timing_header(timings, elapsed)
+    return response
+
+# Dependency Injection for our clients. The agents only hold config read from
+# the env, so one of each is built at startup and shared by every request.
+_extractor_agent: Optional[ExtractorAgent] = None
+_recipe_extractor: Optional[RecipeExtractorAgent] = None
+
+def start_agents():
+    global _extractor_agent, _recipe_extractor
+    _extractor_agent = ExtractorAgent()
+    _recipe_extractor = RecipeExtractorAgent()
+
+def get_extractor_agent() -> ExtractorAgent:
+    if _extractor_agent is None: raise RuntimeError("Agents not started.")
+    return _extractor_agent
 
-def get_extractor_agent():
-    return ExtractorAgent()
+def get_recipe_extractor() -> RecipeExtractorAgent:
+    if _recipe_extractor is None: raise RuntimeError("Agents not started.")
+    return _recipe_extractor
 
-def get_recipe_extractor():
-    return RecipeExtractorAgent()
+# How often a batch item waits out a saturated extraction pool before giving up
+BATCH_BUSY_RETRIES = 3
+
+def busy_error(e: PoolSaturated) -> HTTPException:
+    """503 telling the client when to come back while the extraction pool is full"""
+    return HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
 
 # NEW MODEL for webhook payload
 class WebhookPayload(BaseModel):
@@ -40,85 +108,199 @@ class WebhookPayload(BaseModel):
 
 
 @app.post("/v1/invoice", response_model=InvoiceResponse)
-async def create_payment_invoice(
-    request: InvoiceRequest,
-    db: aiosqlite.Connection = Depends(get_db),
-    alby: AlbyClient = Depends(get_alby_client)
-):
+async def create_payment_invoice(request: InvoiceRequest):
     try:
-        invoice_data = alby.create_invoice(
-            amount_sats=100, description="Payment for 1x Extractor Agent run"
-        )
-        # Immediately record the new invoice in our database as 'pending'
-        await db.execute(
-            "INSERT INTO invoices (payment_hash, status) VALUES (?, ?)",
-            (invoice_data["payment_hash"], "pending")
-        )
-        await db.commit()
+        # Pre-minted and already recorded as 'pending'; only mints inline if the pool ran dry
+        payment_hash, payment_request = await get_invoice_pool().get()
         return InvoiceResponse(
-            payment_hash=invoice_data["payment_hash"],
-            payment_request=invoice_data["payment_request"]
+            payment_hash=payment_hash,
+            payment_request=payment_request
         )
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to create invoice: {e}")
 
 # NEW ENDPOINT: The webhook listener
 @app.post("/v1/payment-callback")
-async def payment_callback(
-    request: Request,
-    db: aiosqlite.Connection = Depends(get_db)
-):
-    """Listens for and verifies 'invoice.settled' webhooks from Alby via Svix."""
+async def payment_callback(request: Request):
+    """Listens for and verifies 'invoice.settled' webhooks from Alby via Svix.
+    
+    Verified settlements are committed before we answer (together with any
+    arriving at the same moment), so Svix keeps retrying until one is durable;
+    retries are deduplicated by svix-id in the database.
+    """
     try:
-        # Get the headers Svix sends
-        headers = request.headers
         # Get the raw request body
         payload = await request.body()
         
-        # Initialize the Svix webhook verifier with our secret
-        wh = Webhook(WEBHOOK_SECRET)
-        
-        # Verify the payload. This will raise an exception on failure.
-        data = wh.verify(payload, headers)
-
-        # If verification succeeds, the data is a dictionary of the payload.
-        # Check the event type and extract the payment_hash.
-        if data.get("state") == "SETTLED":
-            payment_hash = data.get("payment_hash")
-            if not payment_hash:
-                raise HTTPException(status_code=400, detail="Missing payment_hash in payload")
-            
-            # Update our database
-            await db.execute(
-                "UPDATE invoices SET status = 'settled' WHERE payment_hash = ?",
-                (payment_hash,)
-            )
-            await db.commit()
-            print(f"--- Svix Webhook Verified: Invoice {payment_hash} settled! ---")
-            return {"status": "ok"}
-        else:
-            # We received a valid webhook for an event we don't care about.
-            print(f"Received unhandled Svix event state: {data.get('state')}")
-            return {"status": "ok - unhandled event"}
-
+        # Verify the payload with the long-lived verifier. This will raise an exception on failure.
+        data = verify_webhook(WEBHOOK_SECRET, payload, request.headers)
     except Exception as e:
         # This will catch Svix verification errors and other issues.
         print(f"Webhook processing error: {e}")
         raise HTTPException(status_code=400, detail="Webhook verification failed.")
 
+    # Check the event type and extract the payment_hash.
+    if data.get("state") == "SETTLED":
+        payment_hash = data.get("payment_hash")
+        if not payment_hash:
+            raise HTTPException(status_code=400, detail="Missing payment_hash in payload")
+        
+        # Fall back to the payment hash as the idempotency key if svix-id is missing
+        webhook_id = request.headers.get("svix-id") or f"hash:{payment_hash}"
+        try:
+            applied = await get_settlement_ingestor().submit(webhook_id, payment_hash)
+        except Exception as e:
+            print(f"Failed to record settlement for {payment_hash}: {e}")
+            raise HTTPException(status_code=500, detail="Failed to record settlement.")
+        if not applied:
+            return {"status": "ok - duplicate"}
+        return {"status": "ok"}
+    else:
+        # We received a valid webhook for an event we don't care about.
+        print(f"Received unhandled Svix event state: {data.get('state')}")
+        return {"status": "ok - unhandled event"}
+
+
+# Longest a single long-poll / SSE request may stay open, in seconds
+INVOICE_WAIT_MAX_SECONDS = 60
+INVOICE_STREAM_MAX_SECONDS = 900
+INVOICE_STREAM_KEEPALIVE_SECONDS = 15
+
+async def read_invoice_status(payment_hash: str):
+    async with read_connection() as db:
+        cursor = await db.execute("SELECT status FROM invoices WHERE payment_hash = ?", (payment_hash,))
+        row = await cursor.fetchone()
+    return row[0] if row else None
 
 # NEW ENDPOINT: The client polling endpoint
 @app.get("/v1/invoice/status/{payment_hash}")
 async def get_invoice_status(
     payment_hash: str,
-    db: aiosqlite.Connection = Depends(get_db)
+    wait: float = 0
 ):
-    """Allows the client to poll for the status of their payment."""
-    cursor = await db.execute("SELECT status FROM invoices WHERE payment_hash = ?", (payment_hash,))
-    row = await cursor.fetchone()
-    if not row:
+    """Allows the client to poll for the status of their payment.
+    
+    With ?wait=N (seconds, max 60) this is a long-poll: a pending invoice is held
+    open until it settles or N seconds pass, instead of the client polling in a loop.
+    """
+    events = get_invoice_events()
+    future = events.subscribe(payment_hash) if wait > 0 else None
+    try:
+        status = await read_invoice_status(payment_hash)
+        if status is None:
+            raise HTTPException(status_code=404, detail="Invoice not found")
+        if future is not None and status == "pending":
+            # Re-read on timeout in case another worker's notification got dropped
+            status = await events.wait(future, min(wait, INVOICE_WAIT_MAX_SECONDS)) or await read_invoice_status(payment_hash) or status
+        return {"status": status}
+    finally:
+        if future is not None:
+            events.unsubscribe(payment_hash, future)
+
+@app.get("/v1/invoice/status/{payment_hash}/stream")
+async def stream_invoice_status(payment_hash: str):
+    """Server-Sent Events: the current status right away, then the settlement the moment it happens"""
+    events = get_invoice_events()
+    future = events.subscribe(payment_hash)
+    status = await read_invoice_status(payment_hash)
+    if status is None:
+        events.unsubscribe(payment_hash, future)
         raise HTTPException(status_code=404, detail="Invoice not found")
-    return {"status": row[0]}
+    
+    async def stream():
+        try:
+            yield f"event: status\ndata: {json.dumps({'status': status})}\n\n"
+            if status != "pending":
+                return
+            deadline = time.monotonic() + INVOICE_STREAM_MAX_SECONDS
+            while time.monotonic() < deadline:
+                new_status = await events.wait(future, INVOICE_STREAM_KEEPALIVE_SECONDS)
+                if new_status is None:
+                    # Settled in another worker whose notification got dropped?
+                    new_status = await read_invoice_status(payment_hash) or "pending"
+                if new_status == "pending":
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"event: status\ndata: {json.dumps({'status': new_status})}\n\n"
+                return
+        finally:
+            events.unsubscribe(payment_hash, future)
+    
+    return StreamingResponse(stream(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+
+@app.get("/v1/stats/coalescing")
+async def coalescing_stats():
+    """How many extractions were served by piggybacking on an identical in-flight one"""
+    return single_flight_stats()
+
+
+def runtime_metrics():
+    """Gauges and counters that live in other modules, rendered at scrape time"""
+    yield "# TYPE recipebot_coalesced_calls_total counter"
+    for kind, stats in single_flight_stats().items():
+        yield f'recipebot_coalesced_calls_total{{kind="{kind}",role="leader"}} {stats["leaders"]}'
+        yield f'recipebot_coalesced_calls_total{{kind="{kind}",role="follower"}} {stats["followers"]}'
+    yield "# TYPE recipebot_coalesced_in_flight gauge"
+    for kind, stats in single_flight_stats().items():
+        yield f'recipebot_coalesced_in_flight{{kind="{kind}"}} {stats["in_flight"]}'
+    yield "# TYPE recipebot_cpu_pool_pending gauge"
+    yield f"recipebot_cpu_pool_pending {pending_jobs()}"
+    yield "# TYPE recipebot_invoice_waiters gauge"
+    yield f"recipebot_invoice_waiters {get_invoice_events().waiting}"
+    yield "# TYPE recipebot_worker_bus_messages_total counter"
+    for outcome, count in get_worker_bus().stats().items():
+        yield f'recipebot_worker_bus_messages_total{{outcome="{outcome}"}} {count}'
+
+register_collector(runtime_metrics)
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus text exposition format"""
+    return PlainTextResponse(render_host_metrics(), media_type="text/plain; version=0.0.4")
+
+
+# Admin endpoints are off unless ADMIN_TOKEN is set
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+
+def require_admin(x_admin_token: str = Header(None)):
+    if not ADMIN_TOKEN or not x_admin_token or not hmac.compare_digest(x_admin_token, ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Admin token required.")
+
+@app.post("/v1/admin/profiling", dependencies=[Depends(require_admin)])
+async def enable_profiling(request: ProfilingRequest):
+    """Profile extractions whose page URL matches url_pattern, at sample_rate, for duration_seconds"""
+    profiler = get_profiler()
+    profiler.enable(request.url_pattern, request.sample_rate, request.duration_seconds, request.interval_ms)
+    return profiler.stats()
+
+@app.delete("/v1/admin/profiling", dependencies=[Depends(require_admin)])
+async def disable_profiling():
+    profiler = get_profiler()
+    profiler.disable()
+    return profiler.stats()
+
+@app.get("/v1/admin/profiling", dependencies=[Depends(require_admin)])
+async def profiling_status():
+    return get_profiler().stats()
+
+@app.get("/v1/admin/profiling/{name}", dependencies=[Depends(require_admin)])
+async def download_profile(name: str):
+    """One collapsed-stack file, ready for flamegraph.pl or speedscope"""
+    if name not in list_profiles():
+        raise HTTPException(status_code=404, detail="No such profile.")
+    return FileResponse(os.path.join(PROFILE_DIR, name), media_type="text/plain")
+
+
+@app.get("/v1/stats/strategies")
+async def strategy_stats():
+    """Per-host strategy memory: hosts tracked and how extractions were planned"""
+    return get_strategy_memory().stats()
+
+@app.get("/v1/stats/invoice-pool")
+async def invoice_pool_stats():
+    """How often /v1/invoice was served from the pre-minted pool"""
+    return get_invoice_pool().stats()
 
 
 @app.post("/v1/extract", response_model=ExtractionResponse)
@@ -130,35 +312,113 @@ async def extract_content(
     """Execute the agent. Now checks our internal DB instead of Alby's API."""
     payment_hash = request.payment_hash
     url = str(request.url)
+    spent = False
 
     try:
-        cursor = await db.execute("SELECT status FROM invoices WHERE payment_hash = ?", (payment_hash,))
-        row = await cursor.fetchone()
+        # No capacity check up front: a cache hit needs no extraction worker. If the
+        # pool is full when our job gets there, PoolSaturated gives the invoice back.
+        # Spend the invoice atomically: only a settled, never-used hash gets a used_invoices row
+        with DB_SECONDS.time("write"):
+            cursor = await db.execute(
+                "INSERT OR IGNORE INTO used_invoices (payment_hash) SELECT payment_hash FROM invoices WHERE payment_hash = ? AND status = 'settled'",
+                (payment_hash,)
+            )
+            await db.commit()
 
-        if not row or row[0] != 'settled':
-            raise HTTPException(status_code=402, detail="Payment required or not yet settled.")
+        if cursor.rowcount != 1:
+            raise HTTPException(status_code=402, detail="Payment required, not yet settled, or already used.")
+        spent = True
 
         # If we get here, payment is verified internally.
-        result = agent.run(url=url)
+        # Concurrent requests for the same page share one extraction
+        async with get_profiler().profile(url):
+            result = await get_single_flight("extract").do(
+                canonicalize_url(url),
+                lambda: run_cached(
+                    "extract", url, ExtractionResponse,
+                    lambda doc: agent.run(url=url, doc=doc)
+                )
+            )
+        # Shared with whoever asked first (or cached from them): answer with our own URL
+        if result.url is not None and str(result.url) != url:
+            result = result.model_copy(update={"url": HttpUrl(url)})
         # On success
         await log_request(db, "/v1/extract", 200, payment_hash=payment_hash, url=url)
         return result
 
+    except PoolSaturated as e:
+        await release_invoice(db, payment_hash, spent)
+        await log_request(db, "/v1/extract", 503, payment_hash=payment_hash, url=url, error=str(e))
+        raise busy_error(e)
+
     except HTTPException as e:
         # Log known errors (402, 403)
         await log_request(db, "/v1/extract", e.status_code, payment_hash=payment_hash, url=url, error=e.detail)
         raise e
 
     except Exception as e:
+        await release_invoice(db, payment_hash, spent)
         await log_request(db, "/v1/extract", 500, payment_hash=payment_hash, url=url, error=str(e))
         raise HTTPException(status_code=500, detail=f"An internal error occurred: {str(e)}")
 
+async def release_invoice(db: aiosqlite.Connection, payment_hash: str, spent: bool):
+    """Give the payment back if we failed before delivering anything"""
+    if spent:
+        await db.execute("DELETE FROM used_invoices WHERE payment_hash = ?", (payment_hash,))
+        await db.commit()
+
 async def log_request(db: aiosqlite.Connection, endpoint: str, status_code: int, payment_hash: str = None, url: str = None, error: str = None):
-    await db.execute(
+    # Write-behind: group-committed by the background writer, not on the request path
+    await enqueue_write(
         "INSERT INTO api_logs (endpoint, status_code, payment_hash, url_requested, error_message) VALUES (?, ?, ?, ?, ?)",
         (endpoint, status_code, payment_hash, url, error)
     )
-    await db.commit()
+
+async def log_extraction(db: aiosqlite.Connection, url: str, user_token: str, result: RecipeResponse):
+    RECIPE_EXTRACTIONS.inc(result.extraction_method, result.status, "true" if result.cached else "false")
+    await enqueue_write(
+        "INSERT INTO recipe_extractions (url, user_token, extraction_method, confidence_score, cost_cents) VALUES (?, ?, ?, ?, ?)",
+        (url, user_token, result.extraction_method, result.confidence_score, result.cost_cents)
+    )
+
+async def run_recipe_extraction(
+    recipe_extractor: RecipeExtractorAgent,
+    url: str,
+    on_progress: Optional[Callable[[RecipeResponse], None]] = None
+) -> RecipeResponse:
+    """Cached, coalesced extraction shared by the single, batch and stream endpoints.
+
+    Concurrent requests for the same recipe share one extraction; each caller
+    pays its own credit, logs its own row and gets its own URL back as
+    source_url. Selected URLs are profiled.
+    on_progress sees each intermediate result, but only when this call ends up
+    running the extraction (not on a cache hit or as a single-flight follower).
+    """
+    # Per-host plan: whether to cut the download at the Recipe, skip the LLM, which provider
+    plan = get_strategy_memory().plan(url)
+
+    async def extract(doc):
+        result = None
+        async for result in recipe_extractor.run_progressive(url=url, prefer_fast=True, doc=doc, plan=plan):
+            if on_progress:
+                on_progress(result)
+        return result
+
+    def cacheable(result: RecipeResponse) -> bool:
+        # The basic extraction is only final when the LLM wasn't going to run;
+        # otherwise it's what's left after the LLM timed out or failed
+        return result.extraction_method != "fallback" or not (recipe_extractor.use_ai and plan.use_ai)
+
+    async with get_profiler().profile(url):
+        result = await get_single_flight("recipe").do(
+            canonicalize_url(url),
+            lambda: run_cached("recipe", url, RecipeResponse, extract, stop_at_recipe=plan.stop_at_recipe, cacheable=cacheable)
+        )
+    # The leader (or the request that filled the cache) may have used another
+    # variant of the URL, e.g. with tracking params; each caller gets its own
+    if result.recipe is not None and str(result.recipe.source_url) != url:
+        result = result.model_copy(update={"recipe": result.recipe.model_copy(update={"source_url": HttpUrl(url)})})
+    return result
 
 @app.post("/v1/extract-recipe", response_model=RecipeResponse)
 async def extract_recipe(
@@ -169,63 +429,161 @@ async def extract_recipe(
     """Extract recipe from a URL - supports free tier and subscriptions"""
     url = str(request.url)
     user_token = request.user_token
+    charged = False
     
     try:
-        # Check user subscription/credits
+        # Check user subscription/credits. The extraction pool is only checked
+        # when a job really goes to it (cache hits and JSON-LD pages never do);
+        # a 503 from there refunds the credit below
         if user_token:
             # Verify JWT token and get user info
             # For MVP, simplified auth - would need proper JWT validation
-            cursor = await db.execute(
-                "SELECT recipes_remaining, subscription_type FROM users WHERE token = ?",
-                (user_token,)
-            )
-            user_data = await cursor.fetchone()
-            
-            if not user_data:
-                # New user - give them free tier
-                await db.execute(
-                    "INSERT INTO users (token, recipes_remaining, subscription_type) VALUES (?, ?, ?)",
-                    (user_token, 3, 'free')
-                )
-                await db.commit()
-                recipes_remaining = 3
-                subscription_type = 'free'
-            else:
-                recipes_remaining, subscription_type = user_data
-            
-            # Check if they have access
-            if subscription_type == 'free' and recipes_remaining <= 0:
+            # One atomic statement checks and deducts; monthly subscribers skip the DB
+            if await charge_recipes(db, user_token) is None:
                 raise HTTPException(status_code=402, detail="Free recipes exhausted. Please subscribe.")
-            elif subscription_type == 'monthly':
-                # Unlimited for monthly subscribers
-                pass
-            
-            # Deduct credit for free tier
-            if subscription_type == 'free':
-                await db.execute(
-                    "UPDATE users SET recipes_remaining = recipes_remaining - 1 WHERE token = ?",
-                    (user_token,)
-                )
-                await db.commit()
+            charged = True
         else:
             # No token - use anonymous free tier (3 per IP per month)
             # For MVP, simplified - would need proper IP tracking
             pass
         
         # Extract the recipe
-        result = recipe_extractor.run(url=url, prefer_fast=True)
+        result = await run_recipe_extraction(recipe_extractor, url)
         
         # Log successful extraction
-        await db.execute(
-            "INSERT INTO recipe_extractions (url, user_token, extraction_method, confidence_score, cost_cents) VALUES (?, ?, ?, ?, ?)",
-            (url, user_token, result.extraction_method, result.confidence_score, result.cost_cents)
-        )
-        await db.commit()
+        await log_extraction(db, url, user_token, result)
         
         return result
         
+    except PoolSaturated as e:
+        # The extraction pool was full: don't keep the credit
+        if charged:
+            await refund_recipes(db, user_token)
+        await log_request(db, "/v1/extract-recipe", 503, url=url, error=str(e))
+        raise busy_error(e)
     except HTTPException as e:
         raise e
     except Exception as e:
         await log_request(db, "/v1/extract-recipe", 500, url=url, error=str(e))
-        raise HTTPException(status_code=500, detail=f"Extraction failed: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Extraction failed: {str(e)}")
+
+def sse_event(event: str, data: str) -> str:
+    return f"event: {event}\ndata: {data}\n\n"
+
+@app.post("/v1/extract-recipe/stream")
+async def extract_recipe_stream(
+    request: RecipeRequest,
+    db: aiosqlite.Connection = Depends(get_db),
+    recipe_extractor: RecipeExtractorAgent = Depends(get_recipe_extractor)
+):
+    """Server-Sent Events: a `result` event (a RecipeResponse) as each stage finishes, then `done`.
+
+    Structured data or a cache hit is one final result. Otherwise the basic
+    extraction arrives as soon as the page text is ready and the AI-refined
+    recipe follows; show each `result` as it comes, the last one wins. Charged
+    and logged once, like /v1/extract-recipe. Failures after the stream has
+    started arrive as an `error` event with the HTTP status it would have had.
+    """
+    url = str(request.url)
+    user_token = request.user_token
+    
+    # Charged while we can still answer with a status code; a full extraction
+    # pool comes later as an `error` event (503) and the credit is refunded
+    if user_token and await charge_recipes(db, user_token) is None:
+        raise HTTPException(status_code=402, detail="Free recipes exhausted. Please subscribe.")
+    
+    async def events():
+        start = time.perf_counter()
+        progress = asyncio.Queue()
+        # Its own task, so a client that disconnects doesn't cancel a paid-for extraction
+        task = asyncio.ensure_future(run_recipe_extraction(recipe_extractor, url, progress.put_nowait))
+        last_sent = None
+        getter = None
+        
+        def send(result: RecipeResponse) -> str:
+            nonlocal last_sent
+            STREAM_RESULT_SECONDS.observe(time.perf_counter() - start, "first" if last_sent is None else "update")
+            last_sent = result
+            return sse_event("result", result.model_dump_json())
+        
+        try:
+            while not task.done():
+                getter = asyncio.ensure_future(progress.get())
+                await asyncio.wait({getter, task}, return_when=asyncio.FIRST_COMPLETED)
+                if getter.done():
+                    yield send(getter.result())
+                else:
+                    getter.cancel()
+            while not progress.empty():
+                yield send(progress.get_nowait())
+            result = task.result()
+            if result is not last_sent:
+                yield send(result)  # Cache hit or single-flight follower: only the final result
+            STREAM_RESULT_SECONDS.observe(time.perf_counter() - start, "final")
+            await log_extraction(db, url, user_token, result)
+            yield sse_event("done", json.dumps({"extraction_method": result.extraction_method, "status": result.status}))
+        except PoolSaturated as e:
+            if user_token:
+                await refund_recipes(db, user_token)  # Charged above, but nothing was extracted
+            await log_request(db, "/v1/extract-recipe/stream", 503, url=url, error=str(e))
+            yield sse_event("error", json.dumps({"status_code": 503, "detail": str(e), "retry_after": e.retry_after}))
+        except Exception as e:
+            await log_request(db, "/v1/extract-recipe/stream", 500, url=url, error=str(e))
+            yield sse_event("error", json.dumps({"status_code": 500, "detail": f"Extraction failed: {str(e)}"}))
+        finally:
+            if getter and not getter.done():
+                getter.cancel()  # Client went away mid-stream
+    
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+@app.post("/v1/extract-recipe/batch")
+async def extract_recipe_batch(
+    request: BatchRecipeRequest,
+    db: aiosqlite.Connection = Depends(get_db),
+    recipe_extractor: RecipeExtractorAgent = Depends(get_recipe_extractor)
+):
+    """Extract many recipes, streaming one NDJSON BatchRecipeItem per URL as each finishes"""
+    urls = [str(u) for u in request.urls]
+    user_token = request.user_token
+    
+    if user_token:
+        # Charge the whole batch up front in one atomic statement, so concurrent
+        # batches can't take a free user below zero
+        if await charge_recipes(db, user_token, len(urls)) is None:
+            async with read_connection() as rdb:
+                cursor = await rdb.execute("SELECT recipes_remaining FROM users WHERE token = ?", (user_token,))
+                row = await cursor.fetchone()
+            recipes_remaining = row[0] if row else FREE_TIER_RECIPES
+            raise HTTPException(
+                status_code=402,
+                detail=f"Batch needs {len(urls)} recipes but only {recipes_remaining} free recipes remain. Please subscribe."
+            )
+    
+    async def extract_one(url: str) -> RecipeResponse:
+        # A full extraction pool is transient, so wait it out instead of failing the item
+        for attempt in range(BATCH_BUSY_RETRIES + 1):
+            try:
+                return await run_recipe_extraction(recipe_extractor, url)
+            except PoolSaturated as e:
+                if attempt == BATCH_BUSY_RETRIES:
+                    raise
+                await asyncio.sleep(e.retry_after)
+    
+    async def results():
+        async for index, url, result in fan_out(urls, extract_one):
+            if isinstance(result, Exception):
+                if user_token and isinstance(result, PoolSaturated):
+                    await refund_recipes(db, user_token)  # Charged up front, but never extracted
+                await log_request(db, "/v1/extract-recipe/batch", 500, url=url, error=str(result))
+                result = RecipeResponse(
+                    status="error",
+                    extraction_method="none",
+                    confidence_score=0,
+                    extraction_time_ms=0,
+                    error=str(result)
+                )
+            else:
+                await log_extraction(db, url, user_token, result)
+            yield BatchRecipeItem(index=index, url=url, result=result).model_dump_json() + "\n"
+    
+    return StreamingResponse(results(), media_type="application/x-ndjson")
@@ -0,0 +1,173 @@
+# app/migrations.py
+import aiosqlite
+
+# Ordered schema migrations: (version, description, statements). The applied
+# version is stored in PRAGMA user_version. Never edit a shipped migration,
+# append a new one instead.
+MIGRATIONS = [
+    (1, "base tables", [
+        """
+        CREATE TABLE IF NOT EXISTS invoices (
+            payment_hash TEXT PRIMARY KEY,
+            status TEXT NOT NULL DEFAULT 'pending', -- pending, settled, expired
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS used_invoices (
+            payment_hash TEXT PRIMARY KEY,
+            used_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS users (
+            token TEXT PRIMARY KEY,
+            email TEXT,
+            recipes_remaining INTEGER DEFAULT 3,
+            subscription_type TEXT DEFAULT 'free', -- free, monthly, payperuse
+            stripe_customer_id TEXT,
+            stripe_subscription_id TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS recipe_extractions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            url TEXT NOT NULL,
+            user_token TEXT,
+            extraction_method TEXT,
+            confidence_score REAL,
+            cost_cents REAL,
+            extracted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS api_logs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            endpoint TEXT,
+            status_code INTEGER,
+            payment_hash TEXT,
+            url_requested TEXT,
+            error_message TEXT,
+            logged_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+    ]),
+    (2, "extraction result cache", [
+        # Cached extraction results, keyed by kind + canonical URL
+        """
+        CREATE TABLE IF NOT EXISTS extraction_cache (
+            cache_key TEXT PRIMARY KEY,
+            payload TEXT NOT NULL, -- JSON of the RecipeResponse / ExtractionResponse
+            etag TEXT,
+            last_modified TEXT,
+            validated_at REAL NOT NULL,
+            last_accessed REAL NOT NULL
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_extraction_cache_last_accessed ON extraction_cache (last_accessed)",
+    ]),
+    (3, "analytics and ledger indexes", [
+        "CREATE INDEX IF NOT EXISTS idx_recipe_extractions_url ON recipe_extractions (url)",
+        "CREATE INDEX IF NOT EXISTS idx_recipe_extractions_user_token ON recipe_extractions (user_token)",
+        "CREATE INDEX IF NOT EXISTS idx_recipe_extractions_extracted_at ON recipe_extractions (extracted_at)",
+        "CREATE INDEX IF NOT EXISTS idx_api_logs_logged_at ON api_logs (logged_at)",
+        "CREATE INDEX IF NOT EXISTS idx_invoices_status_created_at ON invoices (status, created_at)",
+    ]),
+    (4, "daily api_logs rollups", [
+        """
+        CREATE TABLE IF NOT EXISTS api_log_daily (
+            day TEXT NOT NULL, -- YYYY-MM-DD
+            endpoint TEXT NOT NULL,
+            status_code INTEGER NOT NULL,
+            request_count INTEGER NOT NULL,
+            error_count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, endpoint, status_code)
+        )
+        """,
+    ]),
+    (5, "incremental auto-vacuum", [
+        # Switching auto_vacuum mode needs a full VACUUM once; afterwards the
+        # retention job reclaims free pages a few at a time.
+        "PRAGMA auto_vacuum = INCREMENTAL",
+        "VACUUM",
+    ]),
+    (6, "webhook dedup seen-set", [
+        # Compact: no rowid, just the svix-id and when we saw it (unix seconds)
+        """
+        CREATE TABLE IF NOT EXISTS webhook_seen (
+            svix_id TEXT PRIMARY KEY,
+            seen_at INTEGER NOT NULL DEFAULT (CAST(strftime('%s', 'now') AS INTEGER))
+        ) WITHOUT ROWID
+        """,
+    ]),
+    (7, "content-fingerprint LLM result cache", [
+        # fingerprint is the 64-bit SimHash stored signed; recipe is RecipeData
+        # JSON, rebased onto the requesting URL on a hit
+        """
+        CREATE TABLE IF NOT EXISTS llm_result_cache (
+            fingerprint INTEGER PRIMARY KEY,
+            numbers INTEGER NOT NULL, -- Hash of the numbers in the text, must match exactly
+            recipe TEXT NOT NULL,
+            source_url TEXT NOT NULL, -- Page it was first extracted from
+            created_at INTEGER NOT NULL,
+            last_accessed INTEGER NOT NULL
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_llm_result_cache_last_accessed ON llm_result_cache(last_accessed)",
+        # One row per 16-bit band: (band index << 16) | band bits
+        """
+        CREATE TABLE IF NOT EXISTS llm_result_bands (
+            band INTEGER NOT NULL,
+            fingerprint INTEGER NOT NULL,
+            PRIMARY KEY (band, fingerprint)
+        ) WITHOUT ROWID
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS llm_result_cache_drop_bands AFTER DELETE ON llm_result_cache BEGIN
+            DELETE FROM llm_result_bands WHERE fingerprint = old.fingerprint AND band IN (
+                old.fingerprint & 65535,
+                65536 | ((old.fingerprint >> 16) & 65535),
+                131072 | ((old.fingerprint >> 32) & 65535),
+                196608 | ((old.fingerprint >> 48) & 65535)
+            );
+        END
+        """,
+    ]),
+    (8, "per-host extraction strategy stats", [
+        # Decayed sums, see services/strategy_memory.py
+        """
+        CREATE TABLE IF NOT EXISTS domain_strategy (
+            host TEXT NOT NULL,
+            strategy TEXT NOT NULL, -- structured, ai:claude, ai:openai
+            attempts REAL NOT NULL,
+            successes REAL NOT NULL,
+            seconds REAL NOT NULL,
+            cost_cents REAL NOT NULL,
+            updated_at INTEGER NOT NULL,
+            PRIMARY KEY (host, strategy)
+        ) WITHOUT ROWID
+        """,
+    ]),
+    (9, "host-wide job runs", [
+        # With several workers, a periodic job runs in whichever claims it first
+        """
+        CREATE TABLE IF NOT EXISTS job_runs (
+            name TEXT PRIMARY KEY,
+            last_run_at INTEGER NOT NULL
+        ) WITHOUT ROWID
+        """,
+    ]),
+]
+
+async def run_migrations(db: aiosqlite.Connection):
+    cursor = await db.execute("PRAGMA user_version")
+    (current,) = await cursor.fetchone()
+    for version, description, statements in MIGRATIONS:
+        if version <= current:
+            continue
+        for sql in statements:
+            await db.execute(sql)
+        await db.execute(f"PRAGMA user_version = {version}")
+        await db.commit()
+        print(f"--- Applied migration {version}: {description} ---")
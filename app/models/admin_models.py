@@ -0,0 +1,20 @@
+import re
+from pydantic import BaseModel, Field, field_validator
+from typing import Optional
+
+class ProfilingRequest(BaseModel):
+    """Turn on the sampling profiler for matching extraction requests"""
+    url_pattern: Optional[str] = None  # Regex searched in the page URL, e.g. "allrecipes\\.com"; None = any
+    sample_rate: float = Field(default=1.0, ge=0, le=1)  # Fraction of matching requests to profile
+    duration_seconds: int = Field(default=600, gt=0, le=86400)  # Switches itself off after this
+    interval_ms: float = Field(default=5, ge=1, le=1000)  # Time between stack samples
+
+    @field_validator("url_pattern")
+    @classmethod
+    def valid_regex(cls, value):
+        if value:
+            try:
+                re.compile(value)
+            except re.error as e:
+                raise ValueError(f"Invalid url_pattern: {e}")
+        return value
@@ -20,4 +20,5 @@ class ExtractionResponse(BaseModel):
     url: Optional[HttpUrl] = None
     title: Optional[str] = None
     text_content: Optional[str] = None
-    error: Optional[str] = None
\ No newline at end of file
+    error: Optional[str] = None
+    cached: bool = False # True when served from the result cache
\ No newline at end of file
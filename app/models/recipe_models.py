@@ -15,6 +15,11 @@ class RecipeRequest(BaseModel):
     user_token: Optional[str] = None  # For authenticated users
     extract_images: bool = False  # Whether to extract step images
 
+class BatchRecipeRequest(BaseModel):
+    """Request to extract many recipes at once, e.g. a whole Pinterest board"""
+    urls: List[HttpUrl] = Field(min_length=1, max_length=300)
+    user_token: Optional[str] = None
+
 class RecipeData(BaseModel):
     """Core recipe data structure"""
     title: str
@@ -42,7 +47,14 @@ class RecipeResponse(BaseModel):
     extraction_time_ms: int
     cost_cents: Optional[float] = None  # Cost in cents for this extraction
     error: Optional[str] = None
+    cached: bool = False  # True when served from the result cache or the content-fingerprint cache
     
+class BatchRecipeItem(BaseModel):
+    """One NDJSON line of a batch response"""
+    index: int  # Position of the URL in the request
+    url: str
+    result: RecipeResponse
+
 class SavedRecipe(BaseModel):
     """Recipe saved by a user"""
     id: str
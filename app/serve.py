@@ -0,0 +1,54 @@
+# app/serve.py
+"""Production entry point: python -m app.serve
+
+Runs WEB_CONCURRENCY uvicorn worker processes (default: one per core we may
+use, i.e. the CPU affinity capped by the container's CPU quota) sharing one
+listening socket under uvicorn's supervisor, which replaces any worker that
+dies. The workers share the SQLite database and a runtime directory next to it
+(see services/workers.py).
+
+Recycling: SIGHUP replaces the workers one at a time, each replacement serving
+before the old one is stopped (finishes in-flight requests for up to
+WORKER_GRACEFUL_TIMEOUT seconds, then runs the shutdown hooks that flush
+queued writes and settlements). WORKER_MAX_REQUESTS also recycles each worker
+after that many requests, plus a random 0..WORKER_MAX_REQUESTS_JITTER so they
+don't all go at once. It's off by default: uvicorn closes connections the
+exiting worker accepted but hadn't read a request from yet, so only turn it on
+behind a proxy that retries those.
+"""
+import os
+import uvicorn
+from uvicorn.supervisors import Multiprocess
+from .services.cpu_pool import available_cpus
+
+HOST = os.getenv("HOST", "0.0.0.0")
+PORT = int(os.getenv("PORT", "80"))
+# Not os.cpu_count(): in a container that's the host's cores, and every worker
+# brings its own extraction pool, HTTP client and SQLite connections
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", str(available_cpus())))
+WORKER_MAX_REQUESTS = int(os.getenv("WORKER_MAX_REQUESTS", "0"))  # 0 = never recycle
+WORKER_MAX_REQUESTS_JITTER = int(os.getenv("WORKER_MAX_REQUESTS_JITTER", str(WORKER_MAX_REQUESTS // 10)))
+WORKER_GRACEFUL_TIMEOUT = int(os.getenv("WORKER_GRACEFUL_TIMEOUT", "30"))
+LOG_LEVEL = os.getenv("LOG_LEVEL", "info")
+
+def main():
+    # Workers size their extraction and invoice pools from this
+    os.environ["WEB_CONCURRENCY"] = str(WEB_CONCURRENCY)
+    config = uvicorn.Config(
+        "app.main:app",
+        host=HOST,
+        port=PORT,
+        workers=WEB_CONCURRENCY,
+        limit_max_requests=WORKER_MAX_REQUESTS or None,
+        limit_max_requests_jitter=WORKER_MAX_REQUESTS_JITTER if WORKER_MAX_REQUESTS else 0,
+        timeout_graceful_shutdown=WORKER_GRACEFUL_TIMEOUT,
+        log_level=LOG_LEVEL,
+    )
+    print(f"--- Serving on {HOST}:{PORT} with {WEB_CONCURRENCY} workers "
+          f"(recycled after {WORKER_MAX_REQUESTS or 'unlimited'} requests) ---")
+    # Always supervised, even with one worker, so a worker that exits (recycled
+    # or crashed) is replaced instead of taking the container down
+    Multiprocess(config, sockets=[config.bind_socket()]).run()
+
+if __name__ == "__main__":
+    main()
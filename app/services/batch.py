@@ -0,0 +1,52 @@
+# app/services/batch.py
+import asyncio
+import os
+import weakref
+from typing import Any, AsyncIterator, Awaitable, Callable, List, Tuple
+from urllib.parse import urlsplit
+
+# Fan-out limits for batch extraction. The per-host limit is shared by every
+# batch in the process so one big Pinterest board can't hammer a single site.
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "16"))
+BATCH_PER_HOST_CONCURRENCY = int(os.getenv("BATCH_PER_HOST_CONCURRENCY", "4"))
+
+_host_limits = weakref.WeakValueDictionary()
+
+def host_semaphore(url: str) -> asyncio.Semaphore:
+    host = (urlsplit(url).hostname or "").lower()
+    semaphore = _host_limits.get(host)
+    if semaphore is None:
+        semaphore = asyncio.Semaphore(BATCH_PER_HOST_CONCURRENCY)
+        _host_limits[host] = semaphore
+    return semaphore
+
+async def fan_out(
+    urls: List[str],
+    worker: Callable[[str], Awaitable[Any]],
+    concurrency: int = BATCH_CONCURRENCY,
+) -> AsyncIterator[Tuple[int, str, Any]]:
+    """Run worker(url) for every URL and yield (index, url, result) in completion order.
+
+    A worker that raises yields the exception as its result instead. If the consumer stops early (client disconnected), outstanding work is cancelled.
+    """
+    overall = asyncio.Semaphore(concurrency)
+    done = asyncio.Queue()
+
+    async def run_one(index: int, url: str):
+        per_host = host_semaphore(url)  # Hold a reference so the weak entry lives while we wait
+        # Host first: a URL queued behind its own host must not sit on a global
+        # slot, or one busy host fills them all and starves the others
+        async with per_host, overall:
+            try:
+                result = await worker(url)
+            except Exception as e:
+                result = e
+        await done.put((index, url, result))
+
+    tasks = [asyncio.ensure_future(run_one(i, url)) for i, url in enumerate(urls)]
+    try:
+        for _ in range(len(tasks)):
+            yield await done.get()
+    finally:
+        for task in tasks:
+            task.cancel()
@@ -0,0 +1,121 @@
+# app/services/cpu_pool.py
+import asyncio
+import math
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+def _cgroup_cpu_quota() -> Optional[float]:
+    """CPUs the container's cgroup quota allows (v2 cpu.max, else v1 CFS quota), None if unlimited"""
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()
+        return None if quota == "max" else int(quota) / int(period)
+    except (OSError, ValueError):
+        pass
+    try:
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_quota_us") as f:
+            quota = int(f.read())
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_period_us") as f:
+            period = int(f.read())
+        return quota / period if quota > 0 and period > 0 else None
+    except (OSError, ValueError):
+        return None
+
+def available_cpus() -> int:
+    """Cores we may actually use: our CPU affinity, capped by the container's CPU quota.
+
+    os.cpu_count() is every core on the host, even in a container limited to one or two.
+    """
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:  # Not available on macOS
+        cpus = os.cpu_count() or 1
+    quota = _cgroup_cpu_quota()
+    if quota is not None:
+        cpus = min(cpus, math.ceil(quota))
+    return max(1, cpus)
+
+# CPU-heavy HTML work (lxml parsing, trafilatura) runs in worker processes so it
+# never blocks the event loop. CPU_POOL_WORKERS=0 runs it inline instead, which
+# is handy for local debugging. With several web workers (WEB_CONCURRENCY, see
+# app/serve.py) each gets its share of the cores by default.
+_WEB_WORKERS = max(1, int(os.getenv("WEB_CONCURRENCY", "1")))
+CPU_POOL_WORKERS = int(os.getenv("CPU_POOL_WORKERS", str(max(1, available_cpus() // _WEB_WORKERS))))
+# Jobs allowed in flight (running + queued) before we shed load with a 503
+CPU_POOL_MAX_PENDING = int(os.getenv("CPU_POOL_MAX_PENDING", str(max(CPU_POOL_WORKERS, 1) * 4)))
+CPU_POOL_RETRY_AFTER = int(os.getenv("CPU_POOL_RETRY_AFTER", "2"))
+
+class PoolSaturated(Exception):
+    """Raised when the extraction pool already has CPU_POOL_MAX_PENDING jobs queued"""
+    def __init__(self, retry_after: int = CPU_POOL_RETRY_AFTER):
+        super().__init__("Extraction workers are saturated, retry shortly.")
+        self.retry_after = retry_after
+
+def _warm_worker():
+    # Pay trafilatura's import and first-run setup once per worker, not per request
+    import trafilatura
+    trafilatura.extract("<html><body><article><p>Warm up the extraction worker.</p></article></body></html>")
+
+def _ping():
+    return os.getpid()
+
+_executor = None
+_pending = 0
+_warming = None
+
+def check_capacity():
+    """Fail fast before doing paid work (credits, LLM calls) if we would shed the job anyway"""
+    if _executor is not None and _pending >= CPU_POOL_MAX_PENDING:
+        raise PoolSaturated()
+
+async def run_in_pool(fn, *args):
+    """Run a picklable top-level function in the pool, or inline when the pool is disabled"""
+    global _pending
+    if _executor is None:
+        return fn(*args)
+    check_capacity()
+    _pending += 1
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_executor, fn, *args)
+    finally:
+        _pending -= 1
+
+def pending_jobs() -> int:
+    """Jobs running or queued in the pool right now"""
+    return _pending
+
+async def _warm_up():
+    # Workers are started lazily, so submit one job per worker to bring them all up now
+    start = time.perf_counter()
+    loop = asyncio.get_running_loop()
+    pids = await asyncio.gather(*(loop.run_in_executor(_executor, _ping) for _ in range(CPU_POOL_WORKERS)))
+    print(f"--- Extraction pool started ({len(set(pids))} workers warm in {time.perf_counter() - start:.2f}s, max_pending={CPU_POOL_MAX_PENDING}) ---")
+
+async def start_cpu_pool():
+    global _executor, _warming
+    if _executor is not None or CPU_POOL_WORKERS <= 0:
+        return
+    # spawn, not fork: forking a process with a running event loop and open sockets is unsafe
+    _executor = ProcessPoolExecutor(
+        max_workers=CPU_POOL_WORKERS,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_warm_worker,
+    )
+    # Warm up in the background: spawning workers and importing trafilatura in
+    # them takes a few hundred ms that startup (and so a scaled-out instance
+    # taking traffic) shouldn't wait for. Extractions arriving meanwhile just
+    # queue for the first free worker.
+    _warming = asyncio.create_task(_warm_up())
+
+async def close_cpu_pool():
+    global _executor, _warming
+    if _warming:
+        await asyncio.gather(_warming, return_exceptions=True)
+        _warming = None
+    if _executor:
+        _executor.shutdown(wait=True, cancel_futures=True)
+        _executor = None
+        print("--- Extraction pool closed ---")
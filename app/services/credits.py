@@ -0,0 +1,62 @@
+# app/services/credits.py
+import os
+import time
+from typing import Optional, Tuple
+import aiosqlite
+from .metrics import DB_SECONDS
+
+FREE_TIER_RECIPES = 3
+# How long an unmetered (monthly/payperuse) user may skip the DB before we re-check.
+# Subscriptions change outside this app, so nothing invalidates the cache: this
+# is how long a cancelled or expired subscriber keeps unmetered access, per worker.
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "60"))
+
+# One statement does the new-user insert, the free-tier check and the deduction,
+# so concurrent requests can't race a balance below zero. Existing tokens always
+# hit the ON CONFLICT branch; the outer WHERE only stops a brand-new user from
+# being created already overdrawn. No row returned = not enough free recipes.
+CHARGE_SQL = """
+    INSERT INTO users (token, recipes_remaining, subscription_type)
+    SELECT :token, :free - :n, 'free'
+    WHERE :n <= :free OR EXISTS (SELECT 1 FROM users WHERE token = :token)
+    ON CONFLICT (token) DO UPDATE SET
+        recipes_remaining = recipes_remaining - CASE WHEN subscription_type = 'free' THEN :n ELSE 0 END
+    WHERE subscription_type != 'free' OR recipes_remaining >= :n
+    RETURNING recipes_remaining, subscription_type
+"""
+
+_unmetered = {}  # token -> (subscription_type, cached_at), one per worker; entries expire after USER_CACHE_TTL
+
+async def charge_recipes(db: aiosqlite.Connection, token: str, n: int = 1) -> Optional[Tuple[Optional[int], str]]:
+    """Charge n recipes to token. Returns (recipes_remaining, subscription_type), or None if refused.
+
+    Unmetered subscribers are answered from memory (for up to USER_CACHE_TTL);
+    recipes_remaining is None then.
+    """
+    cached = _unmetered.get(token)
+    if cached and time.monotonic() - cached[1] < USER_CACHE_TTL:
+        return None, cached[0]
+
+    with DB_SECONDS.time("write"):
+        # Execute and fetch in one call: a RETURNING statement left open across an
+        # await would make any other task's commit on this connection fail
+        rows = await db.execute_fetchall(CHARGE_SQL, {"token": token, "n": n, "free": FREE_TIER_RECIPES})
+        await db.commit()
+    if not rows:
+        return None
+
+    recipes_remaining, subscription_type = rows[0]
+    if subscription_type == 'free':
+        _unmetered.pop(token, None)
+    else:
+        _unmetered[token] = (subscription_type, time.monotonic())
+    return recipes_remaining, subscription_type
+
+async def refund_recipes(db: aiosqlite.Connection, token: str, n: int = 1):
+    """Give back n recipes charged for work we then couldn't do (only free-tier balances were deducted)"""
+    with DB_SECONDS.time("write"):
+        await db.execute(
+            "UPDATE users SET recipes_remaining = recipes_remaining + ? WHERE token = ? AND subscription_type = 'free'",
+            (n, token)
+        )
+        await db.commit()
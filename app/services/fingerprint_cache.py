@@ -0,0 +1,139 @@
+# app/services/fingerprint_cache.py
+import hashlib
+import os
+import re
+import time
+from typing import List, Optional, Tuple
+from ..database import get_db, read_connection, enqueue_write
+from .metrics import LLM_CACHE_LOOKUPS
+
+# LLM extractions keyed by a SimHash of the page text the model was shown, so
+# the same recipe under another URL (pins, AMP pages, syndicated copies) is
+# answered without a paid LLM call. Near-duplicates count: fingerprints within
+# LLM_CACHE_MAX_DISTANCE bits of each other are the same recipe, as long as
+# every number (quantities, times, temperatures) matches exactly: "3 eggs"
+# instead of "2 eggs" is only a bit or two of SimHash but a different recipe.
+#
+# Lookup uses the pigeonhole trick: the 64-bit fingerprint is split into four
+# 16-bit bands, and two fingerprints at most 3 bits apart share at least one
+# band exactly. llm_result_bands indexes (band, fingerprint), so a lookup is
+# four primary-key probes plus a popcount on the few candidates.
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "20000"))  # 0 disables the cache
+LLM_CACHE_MAX_DISTANCE = min(3, int(os.getenv("LLM_CACHE_MAX_DISTANCE", "3")))  # >3 would need more bands
+LLM_CACHE_MIN_SHINGLES = 16  # Less text than this is too little to fingerprint safely
+EVICT_EVERY_N_WRITES = 100
+
+SHINGLE_WORDS = 3
+BANDS = 4
+_WORD_RE = re.compile(r"\w+")
+_NUMBER_RE = re.compile(r"\d+(?:[./]\d+)?")
+
+def _signed(value: int) -> int:
+    """SQLite integers are signed 64-bit"""
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+def simhash(text: str) -> Optional[int]:
+    """64-bit SimHash over word 3-shingles of the normalized text, None if the text is too short"""
+    words = _WORD_RE.findall(text.casefold())
+    shingles = {" ".join(words[i:i + SHINGLE_WORDS]) for i in range(len(words) - SHINGLE_WORDS + 1)}
+    if len(shingles) < LLM_CACHE_MIN_SHINGLES:
+        return None
+    # Per-bit majority vote; counting '1's down the columns of the bit strings
+    # keeps the 64 x shingles loop in C
+    bits = [
+        format(int.from_bytes(hashlib.blake2b(s.encode(), digest_size=8).digest(), "big"), "064b")
+        for s in shingles
+    ]
+    half = len(bits) / 2
+    return int("".join("1" if column.count("1") > half else "0" for column in zip(*bits)), 2)
+
+def number_signature(text: str) -> int:
+    """Signed 64-bit hash of the numbers in the text, in order"""
+    numbers = " ".join(_NUMBER_RE.findall(text))
+    return _signed(int.from_bytes(hashlib.blake2b(numbers.encode(), digest_size=8).digest(), "big"))
+
+def bands(fingerprint: int) -> List[int]:
+    """The four (band index, 16 bits) keys of a fingerprint, matching the delete trigger in migration 7"""
+    return [(i << 16) | ((fingerprint >> (16 * i)) & 0xFFFF) for i in range(BANDS)]
+
+class FingerprintCache:
+    def __init__(self, max_entries: int = LLM_CACHE_MAX_ENTRIES, max_distance: int = LLM_CACHE_MAX_DISTANCE):
+        self.max_entries = max_entries
+        self.max_distance = max_distance
+        self._writes = 0
+
+    async def get(self, fingerprint: int, numbers: int) -> Optional[Tuple[str, int]]:
+        """(recipe JSON, distance) of the nearest cached extraction with the same numbers, or None"""
+        async with read_connection() as db:
+            cursor = await db.execute(
+                """SELECT c.fingerprint, c.recipe FROM llm_result_bands b
+                   JOIN llm_result_cache c ON c.fingerprint = b.fingerprint
+                   WHERE b.band IN (?, ?, ?, ?) AND c.numbers = ?""",
+                bands(fingerprint) + [numbers]
+            )
+            rows = await cursor.fetchall()
+        best = None
+        for candidate, recipe in rows:
+            distance = ((candidate ^ fingerprint) & 0xFFFFFFFFFFFFFFFF).bit_count()
+            if distance <= self.max_distance and (best is None or distance < best[1]):
+                best = (candidate, distance, recipe)
+        if best is None:
+            return None
+        # LRU bookkeeping isn't worth a commit on the hit path
+        await enqueue_write("UPDATE llm_result_cache SET last_accessed = ? WHERE fingerprint = ?", (int(time.time()), best[0]))
+        return best[2], best[1]
+
+    async def put(self, fingerprint: int, numbers: int, recipe_json: str, source_url: str):
+        now = int(time.time())
+        db = await get_db()
+        cursor = await db.execute(
+            """INSERT OR IGNORE INTO llm_result_cache (fingerprint, numbers, recipe, source_url, created_at, last_accessed)
+               VALUES (?, ?, ?, ?, ?, ?)""",
+            (_signed(fingerprint), numbers, recipe_json, source_url, now, now)
+        )
+        if cursor.rowcount == 1:
+            await db.executemany(
+                "INSERT OR IGNORE INTO llm_result_bands (band, fingerprint) VALUES (?, ?)",
+                [(band, _signed(fingerprint)) for band in bands(fingerprint)]
+            )
+            self._writes += 1
+            if self._writes % EVICT_EVERY_N_WRITES == 0:
+                await self._evict(db)
+        await db.commit()
+
+    async def _evict(self, db):
+        # Keep the max_entries most recently used; the trigger drops their bands
+        await db.execute(
+            """DELETE FROM llm_result_cache WHERE fingerprint IN (
+                   SELECT fingerprint FROM llm_result_cache ORDER BY last_accessed DESC LIMIT -1 OFFSET ?
+               )""",
+            (self.max_entries,)
+        )
+
+_cache = FingerprintCache()
+
+def get_fingerprint_cache() -> FingerprintCache:
+    return _cache
+
+async def lookup_extraction(content: str) -> Tuple[Optional[Tuple[int, int]], Optional[str]]:
+    """(key for store_extraction, cached recipe JSON or None). The key is None for text too short to fingerprint."""
+    fingerprint = simhash(content) if LLM_CACHE_MAX_ENTRIES > 0 else None
+    if fingerprint is None:
+        LLM_CACHE_LOOKUPS.inc("skipped")
+        return None, None
+    key = (fingerprint, number_signature(content))
+    try:
+        hit = await get_fingerprint_cache().get(*key)
+    except Exception as e:
+        print(f"Fingerprint cache lookup failed: {e}")
+        hit = None
+    LLM_CACHE_LOOKUPS.inc("miss" if hit is None else "hit" if hit[1] == 0 else "near_hit")
+    return key, hit[0] if hit else None
+
+async def store_extraction(key: Optional[Tuple[int, int]], recipe_json: str, source_url: str):
+    if key is None:
+        return
+    try:
+        await get_fingerprint_cache().put(*key, recipe_json, source_url)
+    except Exception as e:
+        print(f"Fingerprint cache store failed: {e}")
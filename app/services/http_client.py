@@ -0,0 +1,48 @@
+# app/services/http_client.py
+import os
+import httpx
+
+# One shared async client for the whole process. httpx keeps a keep-alive pool
+# per origin inside it, so recipe sites, LLM providers and Alby all reuse their
+# connections instead of doing a fresh TCP/TLS handshake on every call.
+CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "10"))
+MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "500"))
+MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "100"))
+KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))
+
+# HTTP/2 needs the optional `h2` package; fall back to HTTP/1.1 without it.
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+_client = None
+
+def get_http_client() -> httpx.AsyncClient:
+    if _client is None: raise RuntimeError("HTTP client not initialized.")
+    return _client
+
+async def start_http_client():
+    global _client
+    if _client is not None:
+        return
+    _client = httpx.AsyncClient(
+        http2=HTTP2_AVAILABLE,
+        follow_redirects=True,
+        timeout=httpx.Timeout(READ_TIMEOUT, connect=CONNECT_TIMEOUT),
+        limits=httpx.Limits(
+            max_connections=MAX_CONNECTIONS,
+            max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=KEEPALIVE_EXPIRY,
+        ),
+    )
+    print(f"--- HTTP client started (http2={HTTP2_AVAILABLE}, max_connections={MAX_CONNECTIONS}) ---")
+
+async def close_http_client():
+    global _client
+    if _client:
+        await _client.aclose()
+        _client = None
+        print("--- HTTP client closed ---")
@@ -0,0 +1,60 @@
+# app/services/invoice_events.py
+import asyncio
+from typing import Dict, Optional, Set
+from .workers import get_worker_bus
+
+class InvoiceEvents:
+    """In-process pub/sub of invoice status changes, keyed by payment hash.
+
+    payment_callback publishes when an invoice settles; long-poll and SSE status
+    requests wait here instead of re-querying SQLite in a loop. announce() also
+    tells the other workers, since the waiter may be on a different one.
+    """
+
+    def __init__(self):
+        self._waiters: Dict[str, Set[asyncio.Future]] = {}
+
+    def subscribe(self, payment_hash: str) -> asyncio.Future:
+        """Subscribe before reading the current status, so a settlement in between isn't missed"""
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault(payment_hash, set()).add(future)
+        return future
+
+    def unsubscribe(self, payment_hash: str, future: asyncio.Future):
+        waiters = self._waiters.get(payment_hash)
+        if waiters is not None:
+            waiters.discard(future)
+            if not waiters:
+                del self._waiters[payment_hash]
+
+    def publish(self, payment_hash: str, status: str):
+        for future in self._waiters.pop(payment_hash, ()):
+            if not future.done():
+                future.set_result(status)
+
+    def announce(self, payment_hash: str, status: str):
+        """publish() here and in every other worker on the host"""
+        self.publish(payment_hash, status)
+        get_worker_bus().publish("invoice", f"{payment_hash} {status}")
+
+    async def wait(self, future: asyncio.Future, timeout: float) -> Optional[str]:
+        """New status, or None if nothing was published within timeout"""
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    @property
+    def waiting(self) -> int:
+        return sum(len(w) for w in self._waiters.values())
+
+_events = InvoiceEvents()
+
+def _on_remote_status(message: str):
+    payment_hash, status = message.split(" ", 1)
+    _events.publish(payment_hash, status)
+
+get_worker_bus().subscribe("invoice", _on_remote_status)
+
+def get_invoice_events() -> InvoiceEvents:
+    return _events
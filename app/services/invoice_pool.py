@@ -0,0 +1,185 @@
+# app/services/invoice_pool.py
+import asyncio
+import os
+import time
+from collections import deque
+from typing import Deque, List, Optional, Tuple
+from ..database import get_db
+from .alby_client import AlbyClient
+from .workers import WEB_CONCURRENCY
+
+# Our price is fixed, so invoices can be minted ahead of time
+INVOICE_AMOUNT_SATS = 100
+INVOICE_DESCRIPTION = "Payment for 1x Extractor Agent run"
+# 0 = mint on every request. This is for the whole host; each web worker keeps its share.
+INVOICE_POOL_SIZE = -(-int(os.getenv("INVOICE_POOL_SIZE", "20")) // WEB_CONCURRENCY)
+# Retire pooled invoices well before Alby expires them, so a handed-out one stays payable
+INVOICE_POOL_MAX_AGE = float(os.getenv("INVOICE_POOL_MAX_AGE", "1800"))
+INVOICE_MINT_CONCURRENCY = int(os.getenv("INVOICE_MINT_CONCURRENCY", "4"))
+INVOICE_POOL_CHECK_INTERVAL = float(os.getenv("INVOICE_POOL_CHECK_INTERVAL", "5"))
+INVOICE_MINT_BACKOFF_MAX = 60.0
+
+# (payment_hash, payment_request, minted_at)
+PooledInvoice = Tuple[str, str, float]
+
+class InvoicePool:
+    """Keeps INVOICE_POOL_SIZE pending invoices ready so /v1/invoice never waits on Alby.
+
+    Pooled invoices are already in the invoices table as 'pending', so a
+    settlement webhook works the same whether an invoice came from the pool or
+    was minted on demand. Stale ones are marked 'expired' (they were never
+    handed out) and replaced. Invoices left over from a previous run are not
+    reused, since we can't tell whether they were handed out before a crash.
+    """
+
+    def __init__(self, size: int = INVOICE_POOL_SIZE):
+        self.size = size
+        self._alby: Optional[AlbyClient] = None  # Built on the first mint, so a missing token can't stop startup
+        self._ready: Deque[PooledInvoice] = deque()
+        self._retired: List[str] = []  # Stale, never handed out, not yet marked expired
+        self._wake = asyncio.Event()
+        self._task = None
+        self.hits = 0
+        self.misses = 0
+        self.minted = 0
+        self.expired = 0
+
+    def start(self):
+        if self.size <= 0:
+            return
+        if not os.getenv("ALBY_ACCESS_TOKEN"):
+            # check_alby_config() already warned; /v1/invoice reports the error per request
+            print("--- Invoice pool not filling: ALBY_ACCESS_TOKEN is not set ---")
+            return
+        self._task = asyncio.create_task(self._run())
+
+    def take(self) -> Optional[Tuple[str, str]]:
+        """A fresh (payment_hash, payment_request) from the pool, or None if it's empty"""
+        cutoff = time.monotonic() - INVOICE_POOL_MAX_AGE
+        while self._ready:
+            payment_hash, payment_request, minted_at = self._ready.popleft()
+            if minted_at >= cutoff:
+                self.hits += 1
+                if len(self._ready) < self.size // 2:
+                    self._wake.set()
+                return payment_hash, payment_request
+            # Too old to hand out; the replenisher's next pass will mark it expired
+            self._retired.append(payment_hash)
+        self.misses += 1
+        self._wake.set()
+        return None
+
+    async def get(self) -> Tuple[str, str]:
+        """Pooled invoice if there is one, otherwise mint one right now"""
+        invoice = self.take()
+        if invoice is not None:
+            return invoice
+        payment_hash, payment_request, _ = (await self._mint(1))[0]
+        return payment_hash, payment_request
+
+    async def _mint(self, n: int) -> List[PooledInvoice]:
+        """Create n invoices at Alby concurrently and record them as 'pending'"""
+        if self._alby is None:
+            self._alby = AlbyClient()
+        results = await asyncio.gather(*(
+            self._alby.create_invoice(amount_sats=INVOICE_AMOUNT_SATS, description=INVOICE_DESCRIPTION)
+            for _ in range(n)
+        ), return_exceptions=True)
+        now = time.monotonic()
+        minted = [(r["payment_hash"], r["payment_request"], now) for r in results if not isinstance(r, BaseException)]
+        if minted:
+            db = await get_db()
+            await db.executemany(
+                "INSERT INTO invoices (payment_hash, status) VALUES (?, 'pending')",
+                [(payment_hash,) for payment_hash, _, _ in minted]
+            )
+            await db.commit()
+            self.minted += len(minted)
+        if not minted:
+            raise next(r for r in results if isinstance(r, BaseException))
+        return minted
+
+    async def _expire(self, payment_hashes: List[str]):
+        if not payment_hashes:
+            return
+        db = await get_db()
+        await db.executemany(
+            "UPDATE invoices SET status = 'expired' WHERE payment_hash = ? AND status = 'pending'",
+            [(payment_hash,) for payment_hash in payment_hashes]
+        )
+        await db.commit()
+        self.expired += len(payment_hashes)
+
+    async def replenish(self):
+        """One pass: retire stale invoices, then top the pool back up"""
+        cutoff = time.monotonic() - INVOICE_POOL_MAX_AGE
+        while self._ready and self._ready[0][2] < cutoff:
+            self._retired.append(self._ready.popleft()[0])
+        retired, self._retired = self._retired, []
+        await self._expire(retired)
+
+        while len(self._ready) < self.size:
+            n = min(self.size - len(self._ready), INVOICE_MINT_CONCURRENCY)
+            self._ready.extend(await self._mint(n))
+
+    async def _run(self):
+        backoff = 1.0
+        while True:
+            try:
+                await self.replenish()
+                backoff = 1.0
+                timeout = INVOICE_POOL_CHECK_INTERVAL
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Invoice pool refill failed, retrying in {backoff:.0f}s: {e}")
+                timeout = backoff
+                backoff = min(backoff * 2, INVOICE_MINT_BACKOFF_MAX)
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+    async def close(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        # Nobody has seen these, so they can never be paid
+        leftover = self._retired + [payment_hash for payment_hash, _, _ in self._ready]
+        self._ready.clear()
+        self._retired = []
+        await self._expire(leftover)
+
+    def stats(self) -> dict:
+        return {
+            "ready": len(self._ready),
+            "size": self.size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "minted": self.minted,
+            "expired": self.expired,
+        }
+
+_pool = None
+
+async def start_invoice_pool():
+    global _pool
+    if _pool is None:
+        _pool = InvoicePool()
+        _pool.start()
+        print(f"--- Invoice pool started (size={_pool.size}) ---")
+
+async def close_invoice_pool():
+    global _pool
+    if _pool:
+        await _pool.close()
+        _pool = None
+
+def get_invoice_pool() -> InvoicePool:
+    if _pool is None: raise RuntimeError("Invoice pool not started.")
+    return _pool
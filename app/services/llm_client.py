@@ -0,0 +1,244 @@
+# app/services/llm_client.py
+import asyncio
+import json
+import os
+import time
+from typing import Any, AsyncIterator, Awaitable, Dict
+import httpx
+from .http_client import get_http_client, CONNECT_TIMEOUT
+from .metrics import LLM_SECONDS, LLM_TOKENS
+
+# Overridable so load tests can point at local stub providers
+ANTHROPIC_API_URL = os.getenv("ANTHROPIC_API_URL", "https://api.anthropic.com/v1/messages")
+OPENAI_API_URL = os.getenv("OPENAI_API_URL", "https://api.openai.com/v1/chat/completions")
+
+# Whole-call deadlines per provider, in seconds
+ANTHROPIC_TIMEOUT = float(os.getenv("ANTHROPIC_TIMEOUT", "30"))
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "30"))
+# Once the JSON object is complete we only wait this long for the trailing usage event
+LLM_USAGE_GRACE = float(os.getenv("LLM_USAGE_GRACE", "0.5"))
+
+# USD per million (input, output) tokens
+PRICING_PER_MTOK = {
+    "claude-3-haiku-20240307": (0.25, 1.25),
+    "gpt-3.5-turbo": (0.50, 1.50),
+    "gpt-4o-mini": (0.15, 0.60),
+}
+
+class LLMResult:
+    """One streamed completion: the raw text, the parsed JSON object and token usage"""
+
+    def __init__(self, provider: str, model: str):
+        self.provider = provider
+        self.model = model
+        self.text = ""
+        self.data = None
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.usage_reported = False  # False when we closed the stream before the usage event
+
+    @property
+    def cost_cents(self) -> float:
+        input_price, output_price = PRICING_PER_MTOK.get(self.model, (0.0, 0.0))
+        return (self.input_tokens * input_price + self.output_tokens * output_price) / 1_000_000 * 100
+
+class JsonObjectStream:
+    """Tracks brace depth over streamed text to spot the end of the first top-level JSON object.
+
+    Anything before the opening '{' (a ```json fence, a preamble) is skipped.
+    """
+
+    def __init__(self):
+        self.done = False
+        self._parts = []
+        self._depth = 0
+        self._started = False
+        self._in_string = False
+        self._escape = False
+
+    def feed(self, text: str) -> bool:
+        if self.done:
+            return True
+        if not self._started:
+            start = text.find('{')
+            if start < 0:
+                return False
+            self._started = True
+            text = text[start:]
+
+        for i, ch in enumerate(text):
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == '\\':
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+            elif ch in '{[':
+                self._depth += 1
+            elif ch in '}]':
+                self._depth -= 1
+                if self._depth == 0:
+                    self._parts.append(text[:i + 1])
+                    self.done = True
+                    return True
+        self._parts.append(text)
+        return False
+
+    def value(self) -> Dict[str, Any]:
+        if not self.done:
+            raise ValueError("LLM reply did not contain a complete JSON object")
+        return json.loads(''.join(self._parts))
+
+async def _sse_events(response: httpx.Response) -> AsyncIterator[Dict[str, Any]]:
+    async for line in response.aiter_lines():
+        if not line.startswith("data:"):
+            continue
+        payload = line[5:].strip()
+        if payload == "[DONE]":
+            return
+        try:
+            yield json.loads(payload)
+        except json.JSONDecodeError:
+            continue
+
+async def _consume(response: httpx.Response, result: LLMResult, on_event) -> JsonObjectStream:
+    """Feed SSE events to on_event until usage arrives, or the object is done and the grace period ran out"""
+    if response.status_code >= 400:
+        await response.aread()
+        response.raise_for_status()
+    json_stream = JsonObjectStream()
+    events = _sse_events(response).__aiter__()
+    loop = asyncio.get_running_loop()
+    done_at = None
+    try:
+        while True:
+            if done_at is None:
+                event = await events.__anext__()
+            else:
+                remaining = LLM_USAGE_GRACE - (loop.time() - done_at)
+                if remaining <= 0:
+                    break
+                event = await asyncio.wait_for(events.__anext__(), remaining)
+            text = on_event(event)
+            if text and not json_stream.done and json_stream.feed(text):
+                done_at = loop.time()
+            if result.usage_reported and json_stream.done:
+                break
+    except (StopAsyncIteration, asyncio.TimeoutError):
+        pass
+    finally:
+        await events.aclose()
+    return json_stream
+
+def _finish(result: LLMResult, json_stream: JsonObjectStream, prompt: str) -> LLMResult:
+    result.data = json_stream.value()
+    if not result.usage_reported:
+        # Stream was cut before the usage event, fall back to a length estimate
+        result.input_tokens = result.input_tokens or len(prompt) // 4
+        result.output_tokens = max(result.output_tokens, len(result.text) // 4)
+    return result
+
+async def _stream_claude(api_key: str, prompt: str, model: str, max_tokens: int) -> LLMResult:
+    result = LLMResult("anthropic", model)
+
+    def on_event(event):
+        etype = event.get("type")
+        if etype == "message_start":
+            usage = event.get("message", {}).get("usage", {})
+            result.input_tokens = usage.get("input_tokens", 0)
+            result.output_tokens = usage.get("output_tokens", 0)
+        elif etype == "content_block_delta":
+            text = event.get("delta", {}).get("text", "")
+            result.text += text
+            return text
+        elif etype == "message_delta":
+            result.output_tokens = event.get("usage", {}).get("output_tokens", result.output_tokens)
+            result.usage_reported = True
+        elif etype == "error":
+            raise ValueError(f"Anthropic stream error: {event.get('error')}")
+        return None
+
+    async with get_http_client().stream(
+        "POST",
+        ANTHROPIC_API_URL,
+        headers={
+            "x-api-key": api_key,
+            "anthropic-version": "2023-06-01",
+            "content-type": "application/json"
+        },
+        json={
+            "model": model,
+            "max_tokens": max_tokens,
+            "stream": True,
+            "messages": [{"role": "user", "content": prompt}]
+        },
+        timeout=httpx.Timeout(ANTHROPIC_TIMEOUT, connect=CONNECT_TIMEOUT)
+    ) as response:
+        json_stream = await _consume(response, result, on_event)
+    return _finish(result, json_stream, prompt)
+
+async def _stream_openai(api_key: str, prompt: str, model: str, max_tokens: int) -> LLMResult:
+    result = LLMResult("openai", model)
+
+    def on_event(event):
+        usage = event.get("usage")
+        if usage:
+            result.input_tokens = usage.get("prompt_tokens", 0)
+            result.output_tokens = usage.get("completion_tokens", 0)
+            result.usage_reported = True
+        choices = event.get("choices") or []
+        if choices:
+            text = choices[0].get("delta", {}).get("content") or ""
+            result.text += text
+            return text
+        return None
+
+    async with get_http_client().stream(
+        "POST",
+        OPENAI_API_URL,
+        headers={
+            "Authorization": f"Bearer {api_key}",
+            "Content-Type": "application/json"
+        },
+        json={
+            "model": model,
+            "messages": [
+                {"role": "system", "content": "You are a recipe extraction assistant. Return only valid JSON."},
+                {"role": "user", "content": prompt}
+            ],
+            "max_tokens": max_tokens,
+            "temperature": 0.1,
+            "stream": True,
+            "stream_options": {"include_usage": True}
+        },
+        timeout=httpx.Timeout(OPENAI_TIMEOUT, connect=CONNECT_TIMEOUT)
+    ) as response:
+        json_stream = await _consume(response, result, on_event)
+    return _finish(result, json_stream, prompt)
+
+async def _observed(provider: str, call: Awaitable[LLMResult]) -> LLMResult:
+    """Record call latency (by outcome) and token usage per provider"""
+    start = time.perf_counter()
+    outcome = "error"
+    try:
+        result = await call
+        outcome = "ok"
+        LLM_TOKENS.inc(provider, "input", amount=result.input_tokens)
+        LLM_TOKENS.inc(provider, "output", amount=result.output_tokens)
+        return result
+    except asyncio.TimeoutError:
+        outcome = "timeout"
+        raise
+    finally:
+        LLM_SECONDS.observe(time.perf_counter() - start, provider, outcome)
+
+async def call_claude(api_key: str, prompt: str, model: str = "claude-3-haiku-20240307", max_tokens: int = 2000) -> LLMResult:
+    """Stream a Claude completion and return as soon as the JSON object is complete"""
+    return await _observed("anthropic", asyncio.wait_for(_stream_claude(api_key, prompt, model, max_tokens), ANTHROPIC_TIMEOUT))
+
+async def call_openai(api_key: str, prompt: str, model: str = "gpt-3.5-turbo", max_tokens: int = 2000) -> LLMResult:
+    """Stream an OpenAI chat completion and return as soon as the JSON object is complete"""
+    return await _observed("openai", asyncio.wait_for(_stream_openai(api_key, prompt, model, max_tokens), OPENAI_TIMEOUT))
@@ -0,0 +1,194 @@
+# app/services/metrics.py
+import asyncio
+import os
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple
+
+# Tiny Prometheus text-format metrics, no client library needed.
+# Every observation happens on the event loop thread (pool and DB work is timed
+# from the loop, not inside the worker), so plain dict/list updates are safe
+# without locks and cost a dict lookup plus a bisect.
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_registry: List["_Metric"] = []
+_collectors: List[Callable[[], Iterable[str]]] = []
+
+def _label_str(names: Sequence[str], values: Tuple, extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(str(v))}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _num(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        _registry.append(self)
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} {self.kind}"
+        yield from self._samples()
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        super().__init__(name, help, labels)
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, *label_values, amount: float = 1):
+        self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def _samples(self):
+        for key, value in sorted(self._values.items()):
+            yield f"{self.name}{_label_str(self.labels, key)} {_num(value)}"
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+        self._series: Dict[Tuple, list] = {}  # labels -> [per-bucket counts..., +Inf count, sum]
+
+    def observe(self, value: float, *label_values):
+        series = self._series.get(label_values)
+        if series is None:
+            series = self._series[label_values] = [0] * (len(self.buckets) + 1) + [0.0]
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def time(self, *label_values) -> "_Timer":
+        """with HISTOGRAM.time("label"): ..."""
+        return _Timer(self, label_values)
+
+    def _samples(self):
+        for key, series in sorted(self._series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series):
+                cumulative += count
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{bound!r}"'
+                yield f"{self.name}_bucket{_label_str(self.labels, key, le)} {cumulative}"
+            yield f"{self.name}_sum{_label_str(self.labels, key)} {series[-1]!r}"
+            yield f"{self.name}_count{_label_str(self.labels, key)} {cumulative}"
+
+class _Timer:
+    __slots__ = ("histogram", "label_values", "start")
+
+    def __init__(self, histogram: Histogram, label_values: Tuple):
+        self.histogram = histogram
+        self.label_values = label_values
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start, *self.label_values)
+
+    # Same thing for async with, e.g. around a whole read_connection block
+    async def __aenter__(self):
+        return self.__enter__()
+
+    async def __aexit__(self, *exc):
+        self.__exit__(*exc)
+
+def register_collector(collector: Callable[[], Iterable[str]]):
+    """Add a callable yielding ready-made exposition lines, for stats that live elsewhere"""
+    _collectors.append(collector)
+
+def render_metrics() -> str:
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    for collector in _collectors:
+        lines.extend(collector())
+    return "\n".join(lines) + "\n"
+
+# --- The metrics themselves, shared by the modules that record them
+
+FETCH_SECONDS = Histogram(
+    "recipebot_fetch_seconds",
+    "Page fetch phases: connect (DNS + TCP), tls, ttfb (request sent to response headers), download (body)",
+    ["phase"],
+)
+STAGE_SECONDS = Histogram(
+    "recipebot_stage_seconds",
+    "Extraction stages: jsonld_scan, trafilatura (includes pool queueing)",
+    ["stage"],
+)
+LLM_SECONDS = Histogram(
+    "recipebot_llm_seconds",
+    "Whole LLM extraction call per provider",
+    ["provider", "outcome"],
+    buckets=(0.25, 0.5, 1.0, 2.0, 3.0, 5.0, 7.5, 10.0, 15.0, 20.0, 30.0, 60.0),
+)
+LLM_TOKENS = Counter("recipebot_llm_tokens_total", "LLM tokens used", ["provider", "direction"])
+DB_SECONDS = Histogram(
+    "recipebot_db_seconds",
+    "SQLite time: read (incl. waiting for a pooled reader), write (request-path), write_batch (group commits)",
+    ["op"],
+)
+RECIPE_EXTRACTIONS = Counter(
+    "recipebot_recipe_extractions_total",
+    "Recipe extractions served, by the method that produced them",
+    ["method", "status", "cached"],
+)
+LLM_CACHE_LOOKUPS = Counter(
+    "recipebot_llm_cache_lookups_total",
+    "Content-fingerprint cache lookups before an LLM call: hit, near_hit, miss, skipped (too little text or cache off)",
+    ["outcome"],
+)
+HTTP_REQUEST_SECONDS = Histogram(
+    "recipebot_http_request_seconds",
+    "API request latency by route",
+    ["method", "route", "status"],
+)
+STREAM_RESULT_SECONDS = Histogram(
+    "recipebot_stream_result_seconds",
+    "Progressive extraction stream: time to the first result event (what the user waits for), later updates, and the final result",
+    ["event"],
+)
+EVENT_LOOP_LAG = Histogram(
+    "recipebot_event_loop_lag_seconds",
+    "How late a periodic sleep on the event loop woke up, i.e. how long something blocked the loop",
+    buckets=(0.0005, 0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5),
+)
+
+LOOP_LAG_INTERVAL = float(os.getenv("LOOP_LAG_INTERVAL", "0.1"))
+
+async def _watch_loop_lag():
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(LOOP_LAG_INTERVAL)
+        EVENT_LOOP_LAG.observe(max(0.0, loop.time() - start - LOOP_LAG_INTERVAL))
+
+_lag_task = None
+
+async def start_loop_lag_monitor():
+    global _lag_task
+    if _lag_task is None:
+        _lag_task = asyncio.create_task(_watch_loop_lag())
+
+async def stop_loop_lag_monitor():
+    global _lag_task
+    if _lag_task:
+        _lag_task.cancel()
+        try:
+            await _lag_task
+        except asyncio.CancelledError:
+            pass
+        _lag_task = None
@@ -0,0 +1,175 @@
+# app/services/profiler.py
+import asyncio
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import asynccontextmanager
+from typing import List, Optional
+from urllib.parse import urlsplit
+from .workers import get_worker_bus
+
+# On-demand sampling profiler for slow sites. An admin switches it on for a URL
+# pattern and/or a sampling rate; each selected extraction gets its own
+# collapsed-stack file (flamegraph.pl / speedscope format) in PROFILE_DIR.
+# Switching it on or off is broadcast to the other workers, so whichever one
+# serves a request (or the status call) has the same settings.
+PROFILE_DIR = os.getenv("PROFILE_DIR", "/data/profiles")
+PROFILE_MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", "200"))  # Oldest files are deleted past this
+PROFILE_MAX_DEPTH = 128
+
+def _collapse(frame) -> str:
+    """Root-first 'func (file.py:line);...' for one stack, like py-spy's collapsed output"""
+    frames = []
+    while frame is not None and len(frames) < PROFILE_MAX_DEPTH:
+        code = frame.f_code
+        frames.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+        frame = frame.f_back
+    return ";".join(reversed(frames))
+
+class SamplingProfiler:
+    """Samples the event loop thread's stack from a background thread.
+
+    Sampling runs only while at least one selected request is in flight, and
+    every sample goes to all of them, so requests profiled at the same time
+    share samples. HTML parsing runs in the extraction pool, so it shows up as
+    time waiting on run_in_executor rather than as lxml frames.
+    """
+
+    def __init__(self):
+        self.pattern: Optional[re.Pattern] = None
+        self.sample_rate = 0.0
+        self.interval = 0.005
+        self.until = 0.0
+        self.profiled = 0
+        self._sessions: List[Counter] = []
+        self._lock = threading.Lock()
+        self._thread = None
+        self._loop_thread_id = None
+
+    def enable(self, url_pattern: Optional[str], sample_rate: float, duration_seconds: float, interval_ms: float):
+        # Wall-clock deadline, so every worker switches off at the same moment
+        self._apply_and_broadcast({
+            "url_pattern": url_pattern,
+            "sample_rate": sample_rate,
+            "interval_ms": interval_ms,
+            "until": time.time() + duration_seconds,
+        })
+        print(f"--- Profiling enabled (pattern={url_pattern!r}, rate={sample_rate}, for {duration_seconds}s) ---")
+
+    def disable(self):
+        self._apply_and_broadcast({
+            "url_pattern": None,
+            "sample_rate": 0.0,
+            "interval_ms": self.interval * 1000,
+            "until": 0.0,
+        })
+        print("--- Profiling disabled ---")
+
+    def _apply_and_broadcast(self, settings: dict):
+        self._apply(settings)
+        get_worker_bus().publish("profiler", json.dumps(settings))
+
+    def _apply(self, settings: dict):
+        url_pattern = settings["url_pattern"]
+        self.pattern = re.compile(url_pattern) if url_pattern else None
+        self.sample_rate = settings["sample_rate"]
+        self.interval = settings["interval_ms"] / 1000
+        self.until = settings["until"]
+
+    def _on_broadcast(self, message: str):
+        """Another worker's admin call switched profiling on or off"""
+        self._apply(json.loads(message))
+
+    @property
+    def enabled(self) -> bool:
+        return time.time() < self.until
+
+    def should_profile(self, url: str) -> bool:
+        if not self.enabled:
+            return False
+        if self.pattern is not None and not self.pattern.search(url):
+            return False
+        return self.sample_rate >= 1.0 or random.random() < self.sample_rate
+
+    def _sample(self):
+        while True:
+            with self._lock:
+                if not self._sessions:
+                    self._thread = None
+                    return
+                frame = sys._current_frames().get(self._loop_thread_id)
+                if frame is not None:
+                    stack = _collapse(frame)
+                    for samples in self._sessions:
+                        samples[stack] += 1
+            del frame
+            time.sleep(self.interval)
+
+    @asynccontextmanager
+    async def profile(self, url: str):
+        """Profile the enclosed block if this URL is selected, otherwise do nothing"""
+        if not self.should_profile(url):
+            yield
+            return
+        samples = Counter()
+        start = time.perf_counter()
+        with self._lock:
+            self._loop_thread_id = threading.get_ident()
+            self._sessions.append(samples)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._sample, name="sampling-profiler", daemon=True)
+                self._thread.start()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._sessions.remove(samples)
+            self.profiled += 1
+            elapsed_ms = int((time.perf_counter() - start) * 1000)
+            try:
+                path = await asyncio.to_thread(_write_profile, url, elapsed_ms, samples)
+                print(f"--- Profiled {url} ({elapsed_ms}ms, {sum(samples.values())} samples) -> {path} ---")
+            except Exception as e:
+                print(f"Failed to write profile for {url}: {e}")
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "url_pattern": self.pattern.pattern if self.pattern else None,
+            "sample_rate": self.sample_rate,
+            "interval_ms": self.interval * 1000,
+            "seconds_left": max(0, int(self.until - time.time())),
+            "profiled_requests": self.profiled,  # By this worker; files are shared
+            "files": list_profiles(),
+        }
+
+def _write_profile(url: str, elapsed_ms: int, samples: Counter) -> str:
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    host = re.sub(r"[^A-Za-z0-9.-]", "_", urlsplit(url).hostname or "unknown")
+    name = f"{time.strftime('%Y%m%d-%H%M%S')}-{host}-{elapsed_ms}ms-{os.getpid()}-{random.randrange(1 << 16):04x}.collapsed"
+    path = os.path.join(PROFILE_DIR, name)
+    with open(path, "w") as f:
+        for stack, count in samples.most_common():
+            f.write(f"{stack} {count}\n")
+    for old in list_profiles()[PROFILE_MAX_FILES:]:
+        os.remove(os.path.join(PROFILE_DIR, old))
+    return path
+
+def list_profiles() -> List[str]:
+    """Profile file names, newest first"""
+    try:
+        names = [n for n in os.listdir(PROFILE_DIR) if n.endswith(".collapsed")]
+    except FileNotFoundError:
+        return []
+    return sorted(names, reverse=True)
+
+_profiler = SamplingProfiler()
+get_worker_bus().subscribe("profiler", _profiler._on_broadcast)
+
+def get_profiler() -> SamplingProfiler:
+    return _profiler
@@ -0,0 +1,206 @@
+# app/services/result_cache.py
+import os
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Optional, Type, TypeVar
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+from pydantic import BaseModel
+from ..agents.document import PageDocument
+from ..database import get_db, read_connection
+from .server_timing import stage
+from .workers import get_worker_bus
+
+# Finished extractions, keyed by canonical URL. A small in-memory LRU sits in
+# front of the SQLite table so hot URLs never touch the database on a hit. The
+# table is shared by all workers; when one writes a key, the others drop their
+# in-memory copy and re-read it on the next hit.
+RESULT_CACHE_TTL = float(os.getenv("RESULT_CACHE_TTL", "86400"))  # seconds before we revalidate
+RESULT_CACHE_MAX_ENTRIES = int(os.getenv("RESULT_CACHE_MAX_ENTRIES", "50000"))
+RESULT_CACHE_MEMORY_ENTRIES = int(os.getenv("RESULT_CACHE_MEMORY_ENTRIES", "1000"))
+EVICT_EVERY_N_WRITES = 100
+
+TRACKING_PARAMS = {"fbclid", "gclid", "dclid", "msclkid", "igshid", "mc_cid", "mc_eid", "_ga", "ref", "ref_src"}
+
+ResponseT = TypeVar("ResponseT", bound=BaseModel)
+
+def canonicalize_url(url: str) -> str:
+    """Normalize a URL so tracking/ordering variants of the same page share a key"""
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    if parts.port and not ((scheme == "http" and parts.port == 80) or (scheme == "https" and parts.port == 443)):
+        host = f"{host}:{parts.port}"
+    query = sorted(
+        (k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+        if not k.lower().startswith("utm_") and k.lower() not in TRACKING_PARAMS
+    )
+    return urlunsplit((scheme, host, parts.path or "/", urlencode(query), ""))
+
+class CacheEntry:
+    __slots__ = ("key", "payload", "etag", "last_modified", "validated_at", "response")
+
+    def __init__(self, key: str, payload: str, etag: Optional[str], last_modified: Optional[str], validated_at: float):
+        self.key = key
+        self.payload = payload
+        self.etag = etag
+        self.last_modified = last_modified
+        self.validated_at = validated_at
+        self.response = None  # Parsed model, filled on first hit
+
+    def is_fresh(self, now: float) -> bool:
+        return now - self.validated_at < RESULT_CACHE_TTL
+
+    def as_hit(self, model: Type[ResponseT]) -> ResponseT:
+        if self.response is None:
+            self.response = model.model_validate_json(self.payload)
+        update = {"cached": True}
+        if "cost_cents" in model.model_fields:
+            update["cost_cents"] = 0
+        if "extraction_time_ms" in model.model_fields:
+            update["extraction_time_ms"] = 0
+        return self.response.model_copy(update=update)
+
+class ResultCache:
+    def __init__(self, memory_entries: int = RESULT_CACHE_MEMORY_ENTRIES, max_entries: int = RESULT_CACHE_MAX_ENTRIES):
+        self.memory_entries = memory_entries
+        self.max_entries = max_entries
+        self._memory = OrderedDict()
+        self._touched = {}  # key -> last access time, written back lazily on the next put
+        self._writes = 0
+
+    def _remember(self, entry: CacheEntry):
+        self._memory[entry.key] = entry
+        self._memory.move_to_end(entry.key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def forget(self, key: str):
+        self._memory.pop(key, None)
+
+    async def get(self, key: str) -> Optional[CacheEntry]:
+        entry = self._memory.get(key)
+        if entry is not None:
+            self._memory.move_to_end(key)
+        else:
+            async with read_connection() as db:
+                cursor = await db.execute(
+                    "SELECT payload, etag, last_modified, validated_at FROM extraction_cache WHERE cache_key = ?",
+                    (key,)
+                )
+                row = await cursor.fetchone()
+            if not row:
+                return None
+            entry = CacheEntry(key, *row)
+            self._remember(entry)
+        self._touched[key] = time.time()
+        return entry
+
+    async def put(self, key: str, payload: str, etag: Optional[str] = None, last_modified: Optional[str] = None):
+        now = time.time()
+        entry = CacheEntry(key, payload, etag, last_modified, now)
+        self._remember(entry)
+        self._touched.pop(key, None)
+        db = await get_db()
+        await db.execute(
+            """INSERT INTO extraction_cache (cache_key, payload, etag, last_modified, validated_at, last_accessed)
+               VALUES (?, ?, ?, ?, ?, ?)
+               ON CONFLICT(cache_key) DO UPDATE SET
+                   payload = excluded.payload, etag = excluded.etag, last_modified = excluded.last_modified,
+                   validated_at = excluded.validated_at, last_accessed = excluded.last_accessed""",
+            (key, payload, etag, last_modified, now, now)
+        )
+        await self._flush_touches(db)
+        self._writes += 1
+        if self._writes % EVICT_EVERY_N_WRITES == 0:
+            await self._evict(db)
+        await db.commit()
+        get_worker_bus().publish("result_cache", key)
+
+    async def revalidated(self, entry: CacheEntry):
+        """Origin answered 304 Not Modified: the cached result is fresh again"""
+        entry.validated_at = time.time()
+        self._remember(entry)
+        db = await get_db()
+        await db.execute(
+            "UPDATE extraction_cache SET validated_at = ?, last_accessed = ? WHERE cache_key = ?",
+            (entry.validated_at, entry.validated_at, entry.key)
+        )
+        await self._flush_touches(db)
+        await db.commit()
+        get_worker_bus().publish("result_cache", entry.key)
+
+    async def _flush_touches(self, db):
+        if not self._touched:
+            return
+        touched, self._touched = self._touched, {}
+        await db.executemany(
+            "UPDATE extraction_cache SET last_accessed = ? WHERE cache_key = ?",
+            [(accessed, key) for key, accessed in touched.items()]
+        )
+
+    async def _evict(self, db):
+        # Keep the max_entries most recently used rows
+        await db.execute(
+            """DELETE FROM extraction_cache WHERE cache_key IN (
+                   SELECT cache_key FROM extraction_cache ORDER BY last_accessed DESC LIMIT -1 OFFSET ?
+               )""",
+            (self.max_entries,)
+        )
+
+_cache = ResultCache()
+get_worker_bus().subscribe("result_cache", _cache.forget)
+
+def get_result_cache() -> ResultCache:
+    return _cache
+
+async def run_cached(
+    kind: str,
+    url: str,
+    model: Type[ResponseT],
+    extract: Callable[[PageDocument], Awaitable[ResponseT]],
+    stop_at_recipe: bool = False,
+    cacheable: Optional[Callable[[ResponseT], bool]] = None,
+) -> ResponseT:
+    """Serve `url` from the result cache, revalidating stale entries with a conditional GET.
+
+    `extract(doc)` runs the real extraction on the fetched document. A failed
+    download raises unless there's a stale entry to fall back on. Only results
+    that pass `cacheable` are stored (default: any success), so a degraded
+    result (e.g. the fallback after an LLM error) isn't served, and kept alive
+    by 304s, for a whole RESULT_CACHE_TTL.
+    """
+    cache = get_result_cache()
+    key = f"{kind}:{canonicalize_url(url)}"
+
+    try:
+        with stage("cache"):
+            entry = await cache.get(key)
+    except Exception as e:
+        print(f"Result cache lookup failed: {e}")
+        entry = None
+    if entry and entry.is_fresh(time.time()):
+        return entry.as_hit(model)
+
+    doc = None
+    try:
+        if entry:
+            doc = await PageDocument.fetch(url, etag=entry.etag, last_modified=entry.last_modified, stop_at_recipe=stop_at_recipe)
+            if doc is None:
+                await cache.revalidated(entry)
+                return entry.as_hit(model)
+        else:
+            doc = await PageDocument.fetch(url, stop_at_recipe=stop_at_recipe)
+    except Exception as e:
+        if entry:
+            # Origin is down or erroring: a stale result beats no result
+            print(f"Revalidation of {url} failed, serving stale result: {e}")
+            return entry.as_hit(model)
+        raise  # Nothing to fall back on; don't have the agent download it again
+
+    result = await extract(doc)
+    if result.status == "success" and (cacheable is None or cacheable(result)):
+        try:
+            await cache.put(key, result.model_dump_json(), doc.etag, doc.last_modified)
+        except Exception as e:
+            print(f"Result cache store failed: {e}")
+    return result
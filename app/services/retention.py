@@ -0,0 +1,147 @@
+# app/services/retention.py
+import asyncio
+import os
+import time
+import aiosqlite
+from .. import database
+
+# Background housekeeping so /data/agentic_ledger.db doesn't grow forever
+RETENTION_INTERVAL_SECONDS = int(os.getenv("RETENTION_INTERVAL_SECONDS", "3600"))
+API_LOG_RETENTION_DAYS = int(os.getenv("API_LOG_RETENTION_DAYS", "30"))
+PENDING_INVOICE_TTL_HOURS = int(os.getenv("PENDING_INVOICE_TTL_HOURS", "24"))
+VACUUM_PAGES_PER_RUN = int(os.getenv("VACUUM_PAGES_PER_RUN", "1000"))
+# Svix gives up retrying after a few days, so older ids can't come back
+WEBHOOK_SEEN_RETENTION_DAYS = int(os.getenv("WEBHOOK_SEEN_RETENTION_DAYS", "7"))
+# Hosts nobody has asked for in this long don't need a strategy plan any more
+STRATEGY_RETENTION_DAYS = int(os.getenv("STRATEGY_RETENTION_DAYS", "90"))
+
+class RetentionJob:
+    """Rolls old api_logs into api_log_daily, drops unpaid invoices (pending, or
+    expired pool invoices) past their TTL, old webhook ids and stale per-host
+    strategy stats, and reclaims free pages.
+
+    It uses its own connection (own thread, explicit short transactions, one day
+    of logs at a time), so it never holds up the writer connection for long.
+    Every worker runs the loop, but each pass is claimed in job_runs, so only
+    one of them does the work per interval.
+    """
+
+    def __init__(self):
+        self._task = None
+        self._db = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._db:
+            await self._db.close()
+            self._db = None
+
+    async def _run(self):
+        while True:
+            try:
+                if await self._claim():
+                    await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Retention job failed: {e}")
+            await asyncio.sleep(RETENTION_INTERVAL_SECONDS)
+
+    async def _connect(self):
+        if self._db is None:
+            self._db = await aiosqlite.connect(database.DB_PATH, isolation_level=None)
+            for pragma in database.PRAGMA_PROFILE:
+                await self._db.execute(pragma)
+
+    async def _claim(self) -> bool:
+        """True if no worker has started a pass within the last interval (a little less, for timer drift)"""
+        await self._connect()
+        now = int(time.time())
+        cursor = await self._db.execute(
+            """INSERT INTO job_runs (name, last_run_at) VALUES ('retention', ?)
+               ON CONFLICT (name) DO UPDATE SET last_run_at = excluded.last_run_at
+               WHERE job_runs.last_run_at <= ?""",
+            (now, now - int(RETENTION_INTERVAL_SECONDS * 0.9))
+        )
+        return cursor.rowcount == 1
+
+    async def run_once(self):
+        await self._connect()
+        days = await self._roll_up_api_logs()
+        invoices = await self._expire_pending_invoices()
+        await self._db.execute(
+            "DELETE FROM webhook_seen WHERE seen_at < CAST(strftime('%s', 'now') AS INTEGER) - ?",
+            (WEBHOOK_SEEN_RETENTION_DAYS * 86400,)
+        )
+        await self._db.execute(
+            "DELETE FROM domain_strategy WHERE updated_at < CAST(strftime('%s', 'now') AS INTEGER) - ?",
+            (STRATEGY_RETENTION_DAYS * 86400,)
+        )
+        await self._db.execute(f"PRAGMA incremental_vacuum({VACUUM_PAGES_PER_RUN})")
+        if days or invoices:
+            print(f"--- Retention: rolled up {days} days of api_logs, deleted {invoices} expired invoices ---")
+
+    async def _roll_up_api_logs(self) -> int:
+        cutoff = f"-{API_LOG_RETENTION_DAYS} days"
+        days = 0
+        while True:
+            cursor = await self._db.execute(
+                "SELECT date(MIN(logged_at)) FROM api_logs WHERE logged_at < date('now', ?)",
+                (cutoff,)
+            )
+            (day,) = await cursor.fetchone()
+            if day is None:
+                return days
+            await self._db.execute("BEGIN IMMEDIATE")
+            try:
+                await self._db.execute(
+                    """INSERT INTO api_log_daily (day, endpoint, status_code, request_count, error_count)
+                       SELECT ?, COALESCE(endpoint, ''), COALESCE(status_code, 0), COUNT(*), COUNT(error_message)
+                       FROM api_logs WHERE logged_at >= ? AND logged_at < date(?, '+1 day')
+                       GROUP BY COALESCE(endpoint, ''), COALESCE(status_code, 0)
+                       ON CONFLICT (day, endpoint, status_code) DO UPDATE SET
+                           request_count = request_count + excluded.request_count,
+                           error_count = error_count + excluded.error_count""",
+                    (day, day, day)
+                )
+                await self._db.execute(
+                    "DELETE FROM api_logs WHERE logged_at >= ? AND logged_at < date(?, '+1 day')",
+                    (day, day)
+                )
+                await self._db.execute("COMMIT")
+            except Exception:
+                await self._db.execute("ROLLBACK")
+                raise
+            days += 1
+            await asyncio.sleep(0)  # Let request handlers run between days
+
+    async def _expire_pending_invoices(self) -> int:
+        # 'expired' rows are pool invoices rotated out before anyone was given them
+        cursor = await self._db.execute(
+            "DELETE FROM invoices WHERE status IN ('pending', 'expired') AND created_at < datetime('now', ?)",
+            (f"-{PENDING_INVOICE_TTL_HOURS} hours",)
+        )
+        return cursor.rowcount
+
+_job = None
+
+async def start_retention_job():
+    global _job
+    if _job is None:
+        _job = RetentionJob()
+        _job.start()
+
+async def stop_retention_job():
+    global _job
+    if _job:
+        await _job.stop()
+        _job = None
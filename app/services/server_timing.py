@@ -0,0 +1,46 @@
+# app/services/server_timing.py
+import time
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+# Per-request stage durations for the Server-Timing header. The middleware puts a
+# fresh dict in the context; tasks spawned for the request (single-flight
+# leaders, batch items) copy the context and so write into the same dict.
+_timings: ContextVar[Optional[Dict[str, float]]] = ContextVar("server_timings", default=None)
+
+def start_request_timings() -> Dict[str, float]:
+    timings = {}
+    _timings.set(timings)
+    return timings
+
+def record(name: str, seconds: float):
+    """Add to a stage of the current request (a no-op outside a request)"""
+    timings = _timings.get()
+    if timings is not None:
+        timings[name] = timings.get(name, 0.0) + seconds
+
+class stage:
+    """with stage("llm"): ... or async with stage("fetch"): ..."""
+    __slots__ = ("name", "start")
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        record(self.name, time.perf_counter() - self.start)
+
+    async def __aenter__(self):
+        return self.__enter__()
+
+    async def __aexit__(self, *exc):
+        self.__exit__(*exc)
+
+def server_timing_header(timings: Dict[str, float], total: float) -> str:
+    """e.g. 'fetch;dur=84.1, llm;dur=912.4, total;dur=1003.2' (milliseconds)"""
+    parts = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in timings.items()]
+    parts.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(parts)
@@ -0,0 +1,54 @@
+# app/services/single_flight.py
+import asyncio
+from typing import Any, Awaitable, Callable, Dict
+
+class SingleFlight:
+    """Coalesces concurrent calls for the same key into one in-flight task.
+
+    The first caller (the leader) starts the work; everyone arriving while it is
+    running awaits the same result. The work runs as its own task, so a leader
+    whose client disconnects doesn't cancel it for the followers.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.leaders = 0
+        self.followers = 0
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._inflight.get(key)
+        if task is None:
+            self.leaders += 1
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._done(key, t))
+        else:
+            self.followers += 1
+        return await asyncio.shield(task)
+
+    def _done(self, key: str, task: asyncio.Future):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            task.exception()  # Mark retrieved so an orphaned failure isn't logged as "never retrieved"
+
+    def stats(self) -> Dict[str, Any]:
+        calls = self.leaders + self.followers
+        return {
+            "leaders": self.leaders,
+            "followers": self.followers,
+            "in_flight": len(self._inflight),
+            "coalescing_ratio": self.followers / calls if calls else 0.0,
+        }
+
+_flights = {}
+
+def get_single_flight(kind: str) -> SingleFlight:
+    flight = _flights.get(kind)
+    if flight is None:
+        flight = _flights[kind] = SingleFlight(kind)
+    return flight
+
+def single_flight_stats() -> Dict[str, Dict[str, Any]]:
+    return {kind: flight.stats() for kind, flight in _flights.items()}
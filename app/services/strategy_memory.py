@@ -0,0 +1,239 @@
+# app/services/strategy_memory.py
+import asyncio
+import os
+import random
+import time
+from collections import OrderedDict
+from typing import Dict, Tuple
+from urllib.parse import urlsplit
+from ..database import get_db, read_connection
+from .metrics import DB_SECONDS
+
+# Per-host memory of how each extraction strategy did, used to plan the next
+# extraction for that host:
+#   structured  - the page had a usable JSON-LD Recipe. Where it doesn't, the
+#                 download isn't cut short at a Recipe node (which would only
+#                 mean downloading the page a second time for trafilatura).
+#   ai:<provider> - the LLM call returned a recipe, with its latency and cost.
+#                 Hosts where every provider keeps failing skip the LLM and go
+#                 straight to the basic extraction; otherwise the provider with
+#                 the lowest expected cost per success goes first.
+# Stats are exponentially decayed so a site redesign shows up within
+# STRATEGY_WINDOW extractions, and STRATEGY_EXPLORE_RATE of extractions run
+# the default chain anyway so skipped strategies keep being re-measured.
+STRATEGY_EXPLORE_RATE = float(os.getenv("STRATEGY_EXPLORE_RATE", "0.05"))
+STRATEGY_WINDOW = int(os.getenv("STRATEGY_WINDOW", "50"))
+STRATEGY_MIN_SAMPLES = int(os.getenv("STRATEGY_MIN_SAMPLES", "5"))  # Before a host's stats change anything
+STRATEGY_MIN_SUCCESS_RATE = float(os.getenv("STRATEGY_MIN_SUCCESS_RATE", "0.2"))  # Below this a strategy is skipped
+STRATEGY_CENTS_PER_SECOND = float(os.getenv("STRATEGY_CENTS_PER_SECOND", "0.1"))  # What a second of user waiting is worth
+STRATEGY_MAX_HOSTS = int(os.getenv("STRATEGY_MAX_HOSTS", "10000"))
+STRATEGY_PERSIST_INTERVAL = float(os.getenv("STRATEGY_PERSIST_INTERVAL", "60"))
+STRATEGY_BOOTSTRAP_ROWS = 50000  # Most recent recipe_extractions rows to learn from on a fresh table
+
+_DECAY = 1 - 1 / STRATEGY_WINDOW
+
+def host_key(url: str) -> str:
+    host = (urlsplit(url).hostname or "").lower()
+    return host[4:] if host.startswith("www.") else host
+
+class StrategyStats:
+    __slots__ = ("attempts", "successes", "seconds", "cost_cents")
+
+    def __init__(self, attempts: float = 0.0, successes: float = 0.0, seconds: float = 0.0, cost_cents: float = 0.0):
+        self.attempts = attempts
+        self.successes = successes
+        self.seconds = seconds
+        self.cost_cents = cost_cents
+
+    def add(self, success: bool, seconds: float, cost_cents: float):
+        self.attempts = self.attempts * _DECAY + 1
+        self.successes = self.successes * _DECAY + (1 if success else 0)
+        self.seconds = self.seconds * _DECAY + seconds
+        self.cost_cents = self.cost_cents * _DECAY + cost_cents
+
+    @property
+    def success_rate(self) -> float:
+        return self.successes / self.attempts if self.attempts else 0.0
+
+    def expected_cost(self) -> float:
+        """Cents (latency priced in) spent per successful extraction"""
+        per_attempt = (self.cost_cents + self.seconds * STRATEGY_CENTS_PER_SECOND) / self.attempts
+        return per_attempt / max(self.success_rate, 0.01)
+
+class StrategyPlan:
+    """What to run for one extraction. The default plan is the full chain."""
+    __slots__ = ("host", "stop_at_recipe", "use_ai", "providers", "explore")
+
+    def __init__(self, host: str, stop_at_recipe: bool = True, use_ai: bool = True, providers: Tuple[str, ...] = (), explore: bool = False):
+        self.host = host
+        self.stop_at_recipe = stop_at_recipe
+        self.use_ai = use_ai
+        self.providers = providers  # Preferred LLM providers, best first; () = the agent's default
+        self.explore = explore
+
+class StrategyMemory:
+    def __init__(self, max_hosts: int = STRATEGY_MAX_HOSTS):
+        self.max_hosts = max_hosts
+        self._hosts: "OrderedDict[str, Dict[str, StrategyStats]]" = OrderedDict()
+        self._dirty = set()  # (host, strategy) changed since the last persist
+        self._task = None
+        self._closing = False
+        self._wake = None
+        self.plans = {"default": 0, "explore": 0, "full_download": 0, "skip_ai": 0, "provider_order": 0}
+
+    def _stats(self, host: str) -> Dict[str, StrategyStats]:
+        stats = self._hosts.get(host)
+        if stats is None:
+            stats = self._hosts[host] = {}
+            while len(self._hosts) > self.max_hosts:
+                self._hosts.popitem(last=False)
+        else:
+            self._hosts.move_to_end(host)
+        return stats
+
+    def record(self, url: str, strategy: str, success: bool, seconds: float = 0.0, cost_cents: float = 0.0):
+        host = host_key(url)
+        stats = self._stats(host)
+        entry = stats.get(strategy)
+        if entry is None:
+            entry = stats[strategy] = StrategyStats()
+        entry.add(success, seconds, cost_cents or 0.0)
+        self._dirty.add((host, strategy))
+
+    def plan(self, url: str) -> StrategyPlan:
+        host = host_key(url)
+        if random.random() < STRATEGY_EXPLORE_RATE:
+            self.plans["explore"] += 1
+            # Default chain with a random provider, so every option keeps getting samples
+            providers = ["claude", "openai"]
+            random.shuffle(providers)
+            return StrategyPlan(host, providers=tuple(providers), explore=True)
+        stats = self._hosts.get(host)
+        if not stats:
+            self.plans["default"] += 1
+            return StrategyPlan(host)
+
+        plan = StrategyPlan(host)
+        structured = stats.get("structured")
+        if structured and structured.attempts >= STRATEGY_MIN_SAMPLES and structured.success_rate < STRATEGY_MIN_SUCCESS_RATE:
+            plan.stop_at_recipe = False
+            self.plans["full_download"] += 1
+
+        measured = [(name[3:], s) for name, s in stats.items() if name.startswith("ai:") and s.attempts >= STRATEGY_MIN_SAMPLES]
+        if measured:
+            if all(s.success_rate < STRATEGY_MIN_SUCCESS_RATE for _, s in measured):
+                plan.use_ai = False
+                self.plans["skip_ai"] += 1
+            else:
+                plan.providers = tuple(name for name, s in sorted(measured, key=lambda m: m[1].expected_cost()))
+                self.plans["provider_order"] += 1
+        if plan.stop_at_recipe and plan.use_ai and not plan.providers:
+            self.plans["default"] += 1
+        return plan
+
+    # --- Persistence: load on startup, upsert changed rows every STRATEGY_PERSIST_INTERVAL
+
+    async def load(self):
+        async with read_connection() as db:
+            cursor = await db.execute(
+                """SELECT host, strategy, attempts, successes, seconds, cost_cents FROM domain_strategy
+                   ORDER BY updated_at DESC LIMIT ?""",
+                (self.max_hosts * 3,)
+            )
+            rows = await cursor.fetchall()
+        if rows:
+            for host, strategy, *values in reversed(rows):  # Oldest first, so the LRU order matches
+                self._stats(host)[strategy] = StrategyStats(*values)
+            return len(rows)
+        return await self._bootstrap()
+
+    async def _bootstrap(self) -> int:
+        """First start: learn which hosts ship usable JSON-LD from the extraction log.
+
+        Only the structured strategy can be read off recipe_extractions; a
+        'fallback' row doesn't say whether the LLM failed or was never called,
+        so LLM stats are learned live.
+        """
+        async with read_connection() as db:
+            cursor = await db.execute(
+                "SELECT url, extraction_method FROM recipe_extractions ORDER BY id DESC LIMIT ?",
+                (STRATEGY_BOOTSTRAP_ROWS,)
+            )
+            rows = await cursor.fetchall()
+        for url, method in reversed(rows):
+            if method in ("structured_data", "ai", "fallback"):
+                self.record(url, "structured", method == "structured_data")
+        return len(rows)
+
+    async def persist(self):
+        if not self._dirty:
+            return
+        dirty, self._dirty = self._dirty, set()
+        now = int(time.time())
+        rows = []
+        for host, strategy in dirty:
+            entry = self._hosts.get(host, {}).get(strategy)
+            if entry is not None:
+                rows.append((host, strategy, entry.attempts, entry.successes, entry.seconds, entry.cost_cents, now))
+        db = await get_db()
+        try:
+            with DB_SECONDS.time("write_batch"):
+                await db.executemany(
+                    """INSERT INTO domain_strategy (host, strategy, attempts, successes, seconds, cost_cents, updated_at)
+                       VALUES (?, ?, ?, ?, ?, ?, ?)
+                       ON CONFLICT (host, strategy) DO UPDATE SET
+                           attempts = excluded.attempts, successes = excluded.successes, seconds = excluded.seconds,
+                           cost_cents = excluded.cost_cents, updated_at = excluded.updated_at""",
+                    rows
+                )
+                await db.commit()
+        except Exception:
+            self._dirty |= dirty  # Try again next time
+            raise
+
+    def start(self):
+        self._closing = False
+        self._wake = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while not self._closing:
+            try:
+                await asyncio.wait_for(self._wake.wait(), STRATEGY_PERSIST_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            try:
+                await self.persist()
+            except Exception as e:
+                print(f"Strategy memory persist failed, will retry: {e}")
+
+    async def close(self):
+        self._closing = True
+        self._wake.set()
+        if self._task:
+            await self._task
+            self._task = None
+        await self.persist()
+
+    def stats(self) -> Dict[str, object]:
+        return {"hosts": len(self._hosts), "unsaved": len(self._dirty), "plans": dict(self.plans)}
+
+# Always present so the agent can record and plan even outside the app (benchmarks);
+# start/close only add loading and persistence
+_memory = StrategyMemory()
+
+async def start_strategy_memory():
+    if _memory._task is None:
+        try:
+            rows = await _memory.load()
+            print(f"--- Strategy memory loaded ({rows} rows, {len(_memory._hosts)} hosts) ---")
+        except Exception as e:
+            print(f"Strategy memory load failed, starting empty: {e}")
+        _memory.start()
+
+async def close_strategy_memory():
+    if _memory._task is not None:
+        await _memory.close()
+
+def get_strategy_memory() -> StrategyMemory:
+    return _memory
@@ -0,0 +1,177 @@
+# app/services/webhooks.py
+import asyncio
+import json
+import os
+from typing import TYPE_CHECKING, Any, Dict, List, Tuple
+import aiosqlite
+from .. import database
+from .invoice_events import get_invoice_events
+from .metrics import DB_SECONDS
+
+if TYPE_CHECKING:
+    from svix.webhooks import Webhook
+
+# Settlements are committed before the webhook is acknowledged. Webhooks that
+# arrive together wait for one shared transaction, so the wait is short
+SETTLEMENT_FLUSH_INTERVAL_MS = int(os.getenv("SETTLEMENT_FLUSH_INTERVAL_MS", "10"))
+SETTLEMENT_FLUSH_MAX = int(os.getenv("SETTLEMENT_FLUSH_MAX", "200"))
+
+_verifier = None
+
+def get_webhook_verifier(secret: str) -> "Webhook":
+    """One long-lived verifier; building a Webhook decodes the secret every time"""
+    global _verifier
+    if _verifier is None:
+        if not secret:
+            raise ValueError("ALBY_WEBHOOK_SECRET is not set")
+        # svix pulls in its whole generated API client (~100ms), so it's only
+        # imported once the first webhook arrives, not on every cold start
+        from svix.webhooks import Webhook
+        _verifier = Webhook(secret)
+    return _verifier
+
+def verify_webhook(secret: str, payload: bytes, headers) -> Dict[str, Any]:
+    """Verify the Svix signature and return the JSON body. Raises on a bad signature."""
+    data = get_webhook_verifier(secret).verify(payload, headers)
+    # svix 1.x returns the parsed payload, 2.x returns None
+    return data if data is not None else json.loads(payload)
+
+class SettlementIngestor:
+    """Deduplicates settlement webhooks by svix-id and applies them in group commits.
+
+    submit() returns only once its settlement is committed, so a webhook we
+    acknowledged can't be lost to a crash, and a failed commit fails every
+    webhook in the batch so Svix retries them. The webhook_seen primary key does
+    the deduplication, across restarts and across workers; the UPDATE only moves
+    'pending' invoices, so a retried webhook never rewrites a settled row.
+
+    Batches are written on the ingestor's own connection (like the retention
+    job), so rolling back a failed batch can't touch statements other tasks
+    have pending on the shared writer.
+    """
+
+    def __init__(self):
+        self._queue: List[Tuple[str, str, asyncio.Future]] = []
+        self._wake = asyncio.Event()
+        self._flushing = asyncio.Lock()
+        self._task = None
+        self._db = None
+        self._closing = False
+        self.applied = 0
+        self.duplicates = 0
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def submit(self, webhook_id: str, payment_hash: str) -> bool:
+        """Record a settlement and wait for its commit. False if this webhook id was already seen."""
+        future = asyncio.get_running_loop().create_future()
+        self._queue.append((webhook_id, payment_hash, future))
+        if self._closing:
+            # The flush loop is gone; don't wait for it. A failure reaches us through the future
+            try:
+                await self.flush()
+            except Exception:
+                pass
+        elif len(self._queue) >= SETTLEMENT_FLUSH_MAX:
+            self._wake.set()
+        return await future
+
+    async def _run(self):
+        while not self._closing:
+            try:
+                await asyncio.wait_for(self._wake.wait(), SETTLEMENT_FLUSH_INTERVAL_MS / 1000)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"Settlement flush failed, webhooks will be retried: {e}")
+
+    async def _connect(self) -> aiosqlite.Connection:
+        if self._db is None:
+            self._db = await aiosqlite.connect(database.DB_PATH, isolation_level=None)
+            for pragma in database.PRAGMA_PROFILE:
+                await self._db.execute(pragma)
+        return self._db
+
+    async def flush(self):
+        async with self._flushing:
+            await self._flush()
+
+    async def _flush(self):
+        if not self._queue:
+            return
+        batch, self._queue = self._queue, []
+        try:
+            db = await self._connect()
+            with DB_SECONDS.time("write_batch"):
+                ids = list(dict.fromkeys(webhook_id for webhook_id, _, _ in batch))
+                placeholders = ",".join(["(?)"] * len(ids))
+                await db.execute("BEGIN IMMEDIATE")
+                # RETURNING lists only the rows inserted, i.e. ids no worker has recorded yet
+                rows = await db.execute_fetchall(
+                    f"INSERT INTO webhook_seen (svix_id) VALUES {placeholders} ON CONFLICT DO NOTHING RETURNING svix_id",
+                    ids
+                )
+                unseen = {row[0] for row in rows}
+                fresh = {}  # webhook id -> payment hash, first submit of each new id
+                for webhook_id, payment_hash, _ in batch:
+                    if webhook_id in unseen:
+                        fresh.setdefault(webhook_id, payment_hash)
+                await db.executemany(
+                    "UPDATE invoices SET status = 'settled' WHERE payment_hash = ? AND status = 'pending'",
+                    [(payment_hash,) for payment_hash in fresh.values()]
+                )
+                await db.execute("COMMIT")
+        except Exception as e:
+            if self._db is not None and self._db.in_transaction:
+                try:
+                    await self._db.execute("ROLLBACK")
+                except Exception as rollback_error:
+                    print(f"Settlement rollback failed: {rollback_error}")
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            raise
+
+        events = get_invoice_events()
+        for payment_hash in fresh.values():
+            events.announce(payment_hash, "settled")
+            print(f"--- Svix Webhook Verified: Invoice {payment_hash} settled! ---")
+        self.applied += len(fresh)
+        self.duplicates += len(batch) - len(fresh)
+        for webhook_id, _, future in batch:
+            applied = fresh.pop(webhook_id, None) is not None  # Later submits of the same id are duplicates
+            if not future.done():
+                future.set_result(applied)
+
+    async def close(self):
+        self._closing = True
+        self._wake.set()
+        if self._task:
+            await self._task
+            self._task = None
+        await self.flush()
+        if self._db:
+            await self._db.close()
+            self._db = None
+
+_ingestor = None
+
+async def start_settlement_ingestor():
+    global _ingestor
+    if _ingestor is None:
+        _ingestor = SettlementIngestor()
+        _ingestor.start()
+
+async def close_settlement_ingestor():
+    global _ingestor
+    if _ingestor:
+        await _ingestor.close()
+        _ingestor = None
+
+def get_settlement_ingestor() -> SettlementIngestor:
+    if _ingestor is None: raise RuntimeError("Settlement ingestor not started.")
+    return _ingestor
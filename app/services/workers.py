@@ -0,0 +1,249 @@
+# app/services/workers.py
+import asyncio
+import os
+import socket
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+from .. import database
+from .metrics import render_metrics
+
+# Multi-worker mode: WEB_CONCURRENCY uvicorn worker processes on one host (see
+# app/serve.py), each with its own SQLite connections. What they need to share
+# goes through SQLite (the caches, job claims) or the runtime directory next to
+# the database: one Unix datagram socket per worker for notifications, and one
+# metrics snapshot per worker so /metrics can report the whole host.
+WEB_CONCURRENCY = max(1, int(os.getenv("WEB_CONCURRENCY", "1")))
+WORKER_RUNTIME_DIR = os.getenv("WORKER_RUNTIME_DIR")  # Default: run/ next to the database
+METRICS_SNAPSHOT_INTERVAL = float(os.getenv("METRICS_SNAPSHOT_INTERVAL", "5"))
+
+def runtime_dir() -> str:
+    return WORKER_RUNTIME_DIR or os.path.join(os.path.dirname(os.path.abspath(database.DB_PATH)), "run")
+
+class WorkerBus:
+    """Fire-and-forget broadcast to the other workers on this host.
+
+    Each worker binds bus-<pid>.sock in the runtime directory and publish()
+    sends one datagram to every other socket there. Delivery is best effort (a
+    peer with a full receive buffer misses the message), so it's only used to
+    wake waiters and drop cached copies early; SQLite stays the source of truth.
+    """
+
+    def __init__(self):
+        self._handlers: Dict[str, Callable[[str], None]] = {}
+        self._receiver = None
+        self._sender = None
+        self.directory = None
+        self.path = None
+        self.sent = 0
+        self.received = 0
+        self.dropped = 0
+
+    def subscribe(self, topic: str, handler: Callable[[str], None]):
+        """handler(message) runs on the event loop for every message other workers publish on topic"""
+        self._handlers[topic] = handler
+
+    async def start(self):
+        self.directory = runtime_dir()
+        os.makedirs(self.directory, exist_ok=True)
+        self.path = os.path.join(self.directory, f"bus-{os.getpid()}.sock")
+        try:
+            os.unlink(self.path)  # Left by a crashed worker that had the same pid
+        except FileNotFoundError:
+            pass
+        # A plain socket plus add_reader, since uvloop has no AF_UNIX datagram endpoints
+        self._receiver = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._receiver.setblocking(False)
+        self._receiver.bind(self.path)
+        asyncio.get_running_loop().add_reader(self._receiver.fileno(), self._drain)
+        self._sender = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._sender.setblocking(False)
+
+    def publish(self, topic: str, message: str):
+        if self._sender is None:
+            return
+        data = f"{topic}\n{message}".encode()
+        for name in os.listdir(self.directory):
+            if not (name.startswith("bus-") and name.endswith(".sock")):
+                continue
+            path = os.path.join(self.directory, name)
+            if path == self.path:
+                continue
+            try:
+                self._sender.sendto(data, path)
+                self.sent += 1
+            except (ConnectionRefusedError, FileNotFoundError):
+                # The worker is gone without cleaning up (killed); nobody will bind this again
+                try:
+                    os.unlink(path)
+                except OSError:
+                    pass
+            except BlockingIOError:
+                self.dropped += 1
+
+    def _drain(self):
+        while True:
+            try:
+                data = self._receiver.recv(65536)
+            except (BlockingIOError, InterruptedError):
+                return
+            self._deliver(data)
+
+    def _deliver(self, data: bytes):
+        self.received += 1
+        topic, _, message = data.decode().partition("\n")
+        handler = self._handlers.get(topic)
+        if handler is not None:
+            try:
+                handler(message)
+            except Exception as e:
+                print(f"Worker bus handler for {topic} failed: {e}")
+
+    async def close(self):
+        if self._receiver is not None:
+            asyncio.get_running_loop().remove_reader(self._receiver.fileno())
+            self._receiver.close()
+            self._receiver = None
+        if self._sender is not None:
+            self._sender.close()
+            self._sender = None
+        if self.path:
+            try:
+                os.unlink(self.path)
+            except OSError:
+                pass
+
+    def stats(self) -> Dict[str, int]:
+        return {"sent": self.sent, "received": self.received, "dropped": self.dropped}
+
+# --- Host-wide /metrics. Every worker writes its exposition text to
+# --- metrics-<pid>.prom every METRICS_SNAPSHOT_INTERVAL; whichever worker gets the
+# --- scrape merges its live metrics with the others' snapshots, adding a worker
+# --- label so series from different processes (and recycled ones) stay apart.
+
+def _with_worker_label(line: str, worker: str) -> str:
+    series, value = line.rsplit(" ", 1)
+    label = f'worker="{worker}"'
+    if series.endswith("}"):
+        return f"{series[:-1]},{label}}} {value}"
+    return f"{series}{{{label}}} {value}"
+
+def _families(text: str, worker: str) -> List[Tuple[str, List[str], List[str]]]:
+    """[(name, HELP/TYPE lines, labelled samples)] in exposition order"""
+    families = []
+    for line in text.splitlines():
+        if not line:
+            continue
+        if line.startswith("#"):
+            parts = line.split(" ", 3)
+            if len(parts) >= 3 and parts[1] in ("HELP", "TYPE"):
+                if not families or families[-1][0] != parts[2]:
+                    families.append((parts[2], [], []))
+                families[-1][1].append(line)
+            continue
+        if not families:
+            families.append(("", [], []))
+        families[-1][2].append(_with_worker_label(line, worker))
+    return families
+
+def merge_worker_metrics(snapshots: List[Tuple[str, str]]) -> str:
+    """One exposition from [(worker, text)], each family's samples grouped under one HELP/TYPE"""
+    merged: Dict[str, Tuple[List[str], List[str]]] = {}
+    for worker, text in snapshots:
+        for name, header, samples in _families(text, worker):
+            family = merged.get(name)
+            if family is None:
+                merged[name] = (header, samples)
+            else:
+                family[1].extend(samples)
+    lines = []
+    for header, samples in merged.values():
+        lines.extend(header)
+        lines.extend(samples)
+    return "\n".join(lines) + "\n"
+
+class MetricsSnapshots:
+    def __init__(self):
+        self._task = None
+        self.path = None
+
+    def start(self):
+        self.path = os.path.join(runtime_dir(), f"metrics-{os.getpid()}.prom")
+        self._task = asyncio.create_task(self._run())
+
+    def write(self):
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            f.write(render_metrics())
+        os.replace(tmp, self.path)
+
+    async def _run(self):
+        while True:
+            try:
+                self.write()
+            except OSError as e:
+                print(f"Metrics snapshot failed: {e}")
+            await asyncio.sleep(METRICS_SNAPSHOT_INTERVAL)
+
+    def render(self) -> str:
+        """This worker's live metrics plus every other live worker's latest snapshot"""
+        own = render_metrics()
+        if self.path is None:
+            return own
+        snapshots = [(str(os.getpid()), own)]
+        directory = os.path.dirname(self.path)
+        stale_before = time.time() - max(3 * METRICS_SNAPSHOT_INTERVAL, 30)
+        for name in os.listdir(directory):
+            path = os.path.join(directory, name)
+            if not (name.startswith("metrics-") and name.endswith(".prom")) or path == self.path:
+                continue
+            try:
+                if os.path.getmtime(path) < stale_before:
+                    os.unlink(path)  # Its worker died without cleaning up
+                    continue
+                with open(path) as f:
+                    snapshots.append((name[len("metrics-"):-len(".prom")], f.read()))
+            except OSError:
+                continue  # Replaced or removed while we looked
+        return merge_worker_metrics(snapshots)
+
+    async def close(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self.path:
+            try:
+                os.unlink(self.path)
+            except OSError:
+                pass
+
+_bus = WorkerBus()
+_snapshots: Optional[MetricsSnapshots] = None
+
+async def start_worker_sync():
+    """Join the other workers on this host: notification socket, and metrics snapshots when there are several"""
+    global _snapshots
+    if _bus._receiver is not None:
+        return
+    await _bus.start()
+    if WEB_CONCURRENCY > 1:
+        _snapshots = MetricsSnapshots()
+        _snapshots.start()
+    print(f"--- Worker {os.getpid()} joined {_bus.directory} (WEB_CONCURRENCY={WEB_CONCURRENCY}) ---")
+
+async def close_worker_sync():
+    global _snapshots
+    if _snapshots:
+        await _snapshots.close()
+        _snapshots = None
+    await _bus.close()
+
+def get_worker_bus() -> WorkerBus:
+    return _bus
+
+def render_host_metrics() -> str:
+    """/metrics body: just this process, or every worker on the host in multi-worker mode"""
+    return _snapshots.render() if _snapshots else render_metrics()
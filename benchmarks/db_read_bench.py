@@ -0,0 +1,77 @@
+"""Invoice status polling throughput: shared writer connection vs. the read pool.
+
+By default a background task keeps committing api_logs rows on the writer, like
+production traffic does, so the numbers show reads queuing behind writes.
+Runs against a throwaway SQLite file, no network needed:
+
+    python -m benchmarks.db_read_bench --pollers 1 4 16 64 --seconds 3
+    python -m benchmarks.db_read_bench --no-write-load
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+import uuid
+
+from app import database
+
+async def _poll(conn_factory, hashes, deadline):
+    count = 0
+    i = 0
+    while time.perf_counter() < deadline:
+        async with conn_factory() as conn:
+            cursor = await conn.execute("SELECT status FROM invoices WHERE payment_hash = ?", (hashes[i % len(hashes)],))
+            await cursor.fetchone()
+        count += 1
+        i += 1
+    return count
+
+class _writer_connection:
+    async def __aenter__(self):
+        return await database.get_db()
+
+    async def __aexit__(self, *exc):
+        pass
+
+async def _write_load(deadline):
+    db = await database.get_db()
+    while time.perf_counter() < deadline:
+        await db.execute("INSERT INTO api_logs (endpoint, status_code) VALUES ('/bench', 200)")
+        await db.commit()
+
+async def _measure(conn_factory, pollers, seconds, hashes, write_load):
+    deadline = time.perf_counter() + seconds
+    jobs = [_poll(conn_factory, hashes, deadline) for _ in range(pollers)]
+    if write_load:
+        jobs.append(_write_load(deadline))
+    counts = await asyncio.gather(*jobs)
+    return sum(counts[:pollers]) / seconds
+
+async def main(pollers, seconds, invoices, write_load):
+    with tempfile.TemporaryDirectory() as tmp:
+        database.DB_PATH = os.path.join(tmp, "bench.db")
+        await database.connect_to_db()
+        try:
+            db = await database.get_db()
+            hashes = [uuid.uuid4().hex for _ in range(invoices)]
+            await db.executemany("INSERT INTO invoices (payment_hash, status) VALUES (?, 'pending')", [(h,) for h in hashes])
+            await db.commit()
+
+            print(f"read pool size: {database.DB_READ_POOL_SIZE}, {invoices} invoices, {seconds}s per run, write load: {write_load}")
+            print(f"{'pollers':>8} {'writer qps':>12} {'pool qps':>12} {'speedup':>8}")
+            for n in pollers:
+                writer_qps = await _measure(_writer_connection, n, seconds, hashes, write_load)
+                pool_qps = await _measure(database.read_connection, n, seconds, hashes, write_load)
+                print(f"{n:>8} {writer_qps:>12.0f} {pool_qps:>12.0f} {pool_qps / writer_qps:>7.2f}x")
+        finally:
+            await database.close_db()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pollers", type=int, nargs="+", default=[1, 4, 16, 64])
+    parser.add_argument("--seconds", type=float, default=3.0)
+    parser.add_argument("--invoices", type=int, default=10000)
+    parser.add_argument("--no-write-load", dest="write_load", action="store_false")
+    args = parser.parse_args()
+    asyncio.run(main(args.pollers, args.seconds, args.invoices, args.write_load))
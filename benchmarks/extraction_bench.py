@@ -0,0 +1,176 @@
+"""Micro-benchmark of the extraction strategies over a corpus of saved pages.
+
+Every NAME.html in the corpus directory is a page; an optional NAME.json next to
+it holds the golden fields (title, *_time_minutes, servings, ingredients,
+instructions) that the strategy output is scored against. Reports per-page and
+aggregate throughput, peak memory (tracemalloc) and field-level accuracy, so a
+faster parser can be shown to be both faster and correct. No network needed.
+
+    python -m benchmarks.extraction_bench
+    python -m benchmarks.extraction_bench path/to/corpus --strategies structured duration duration_legacy --per-page
+"""
+import argparse
+import json
+import os
+import re
+import time
+import tracemalloc
+
+from app.agents.document import extract_main_content
+from app.agents.jsonld_scanner import find_recipe_node, scan_json_ld
+from app.agents.prompt_builder import select_recipe_regions
+from app.agents.recipe_extractor import RecipeExtractorAgent, parse_duration
+
+DEFAULT_CORPUS = os.path.join(os.path.dirname(__file__), "fixtures")
+TIME_FIELDS = ("prep_time_minutes", "cook_time_minutes", "total_time_minutes")
+TIME_KEYS = ("prepTime", "cookTime", "totalTime")
+
+def legacy_parse_duration(duration_str):
+    """The parser _parse_schema_recipe used before: regexes compiled per call, PT1H30M -> 30"""
+    if not duration_str:
+        return None
+    match = re.search(r'PT(\d+)M', duration_str)
+    if match:
+        return int(match.group(1))
+    match = re.search(r'PT(\d+)H', duration_str)
+    if match:
+        return int(match.group(1)) * 60
+    return None
+
+class Page:
+    """One corpus page with the inputs each strategy needs, prepared outside the timed loop"""
+
+    def __init__(self, path: str):
+        self.name = os.path.splitext(os.path.basename(path))[0]
+        self.url = f"https://corpus.test/{self.name}"
+        with open(path, "rb") as f:
+            self.raw = f.read()
+        golden_path = os.path.splitext(path)[0] + ".json"
+        self.golden = None
+        if os.path.exists(golden_path):
+            with open(golden_path) as f:
+                self.golden = json.load(f)
+        self.node = None
+        for block in scan_json_ld(self.raw):
+            self.node = find_recipe_node(block)
+            if self.node:
+                break
+        self.content = extract_main_content(self.raw) or ""
+
+def _recipe_fields(recipe):
+    if recipe is None:
+        return {}
+    data = recipe.model_dump()
+    data["ingredients"] = [ingredient["item"] for ingredient in data["ingredients"]]
+    return data
+
+def _durations(parser):
+    def run(page):
+        if not page.node:
+            return {}
+        return {field: parser(page.node.get(key)) for field, key in zip(TIME_FIELDS, TIME_KEYS)}
+    return run
+
+_agent = RecipeExtractorAgent()
+
+RECIPE_FIELDS = ("title",) + TIME_FIELDS + ("servings", "ingredients", "instructions")
+
+# name -> (fn(page) returning a dict of produced fields, golden fields it is scored on; () = timing only)
+STRATEGIES = {
+    "jsonld_scan": (lambda page: scan_json_ld(page.raw), ()),
+    "structured": (lambda page: _recipe_fields(_agent._parse_schema_recipe(page.node, page.url) if page.node else None), RECIPE_FIELDS),
+    "trafilatura": (lambda page: extract_main_content(page.raw), ()),
+    "prompt_regions": (lambda page: select_recipe_regions(page.content), ()),
+    "basic": (lambda page: _recipe_fields(_agent._extract_basic(page.content, page.url)), RECIPE_FIELDS),
+    "duration": (_durations(parse_duration), TIME_FIELDS),
+    "duration_legacy": (_durations(legacy_parse_duration), TIME_FIELDS),
+    "yield": (lambda page: {"servings": _agent._parse_yield(page.node.get("recipeYield"))} if page.node else {}, ("servings",)),
+}
+
+def _norm(value):
+    if isinstance(value, str):
+        return " ".join(value.split()).casefold()
+    return value
+
+def _field_matches(expected, actual) -> bool:
+    if isinstance(expected, list):
+        actual = actual or []
+        return len(expected) == len(actual) and all(_norm(e) == _norm(a) for e, a in zip(expected, actual))
+    return _norm(expected) == _norm(actual)
+
+def score(page: Page, produced, fields):
+    """{field: matched} for the scored fields this page has golden values for; missing output is a miss"""
+    if page.golden is None:
+        return {}
+    return {field: _field_matches(page.golden[field], produced.get(field)) for field in fields if field in page.golden}
+
+def measure(fn, page: Page, min_seconds: float):
+    """(seconds per call, peak bytes allocated during one call, output of that call)"""
+    iterations = 0
+    start = time.perf_counter()
+    while True:
+        fn(page)
+        iterations += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_seconds and iterations >= 3:
+            break
+    tracemalloc.start()
+    produced = fn(page)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed / iterations, peak, produced
+
+def main(corpus, strategies, min_seconds, per_page, json_path):
+    paths = sorted(os.path.join(corpus, n) for n in os.listdir(corpus) if n.endswith(".html"))
+    pages = [Page(path) for path in paths]
+    print(f"{len(pages)} pages from {corpus}, at least {min_seconds}s per page and strategy")
+    if per_page:
+        print(f"{'strategy':<16} {'page':<28} {'us/op':>10} {'ops/s':>10} {'peak KiB':>9} {'accuracy':>9}")
+
+    results = []
+    for name in strategies:
+        fn, fields = STRATEGIES[name]
+        total_time = 0.0
+        peak_max = 0
+        field_hits = {}
+        for page in pages:
+            seconds, peak, produced = measure(fn, page, min_seconds)
+            scores = score(page, produced, fields)
+            total_time += seconds
+            peak_max = max(peak_max, peak)
+            for field, ok in scores.items():
+                hits, total = field_hits.get(field, (0, 0))
+                field_hits[field] = (hits + ok, total + 1)
+            if per_page:
+                accuracy = f"{sum(scores.values())}/{len(scores)}" if scores else "-"
+                print(f"{name:<16} {page.name:<28} {seconds * 1e6:>10.1f} {1 / seconds:>10.0f} {peak / 1024:>9.1f} {accuracy:>9}")
+        hits = sum(h for h, _ in field_hits.values())
+        checked = sum(t for _, t in field_hits.values())
+        results.append({
+            "strategy": name,
+            "pages_per_second": len(pages) / total_time,
+            "mean_us_per_page": total_time / len(pages) * 1e6,
+            "peak_kib": peak_max / 1024,
+            "accuracy": hits / checked if checked else None,
+            "fields": {field: f"{h}/{t}" for field, (h, t) in sorted(field_hits.items())},
+        })
+
+    print()
+    print(f"{'strategy':<16} {'pages/s':>10} {'us/page':>10} {'peak KiB':>9} {'accuracy':>9}  misses")
+    for r in results:
+        accuracy = f"{r['accuracy']:.0%}" if r["accuracy"] is not None else "-"
+        misses = ", ".join(f"{field} {ratio}" for field, ratio in r["fields"].items() if ratio.split("/")[0] != ratio.split("/")[1])
+        print(f"{r['strategy']:<16} {r['pages_per_second']:>10.0f} {r['mean_us_per_page']:>10.1f} {r['peak_kib']:>9.1f} {accuracy:>9}  {misses or '-'}")
+    if json_path:
+        with open(json_path, "w") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("corpus", nargs="?", default=DEFAULT_CORPUS)
+    parser.add_argument("--strategies", nargs="+", choices=list(STRATEGIES), default=list(STRATEGIES))
+    parser.add_argument("--min-seconds", type=float, default=0.2, help="Time each strategy runs per page")
+    parser.add_argument("--per-page", action="store_true")
+    parser.add_argument("--json", help="Also write the aggregate results to this file")
+    args = parser.parse_args()
+    main(args.corpus, args.strategies, args.min_seconds, args.per_page, args.json)
@@ -0,0 +1,283 @@
+"""Offline load test of the whole API: throughput, latency percentiles and event-loop lag.
+
+Starts the app under uvicorn in a subprocess with a temp SQLite DB, pointed at
+local stub servers (benchmarks/stubs.py) for the recipe sites, Anthropic,
+OpenAI and Alby. No network needed. Then drives each scenario at each
+concurrency level and prints RPS, p50/p95/p99 and the app's event-loop lag
+(read from its /metrics histogram, so lag is reported as a bucket bound).
+
+Scenarios:
+  recipe-jsonld  POST /v1/extract-recipe, page with JSON-LD (structured data path)
+  recipe-ai      POST /v1/extract-recipe, page without JSON-LD (trafilatura + stub LLM)
+  extract        POST /v1/extract with a pre-settled invoice per request
+  invoice        POST /v1/invoice (pre-minted pool, stub Alby behind it)
+  status         GET /v1/invoice/status/{hash}
+
+    python -m benchmarks.load_test
+    python -m benchmarks.load_test --scenarios recipe-ai --concurrency 1 16 64 --seconds 15 --llm-latency-ms 1500
+    python -m benchmarks.load_test --distinct-urls 50   # mostly result-cache hits
+    python -m benchmarks.load_test --scenarios recipe-ai --llm-cache   # same text under new URLs: fingerprint-cache hits
+    python -m benchmarks.load_test --workers 4   # multi-worker mode via app/serve.py
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import multiprocessing
+import os
+import re
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+
+import httpx
+
+from .stubs import StubConfig, serve_stubs
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCENARIOS = ["recipe-jsonld", "recipe-ai", "extract", "invoice", "status"]
+BENCH_USER = "bench-monthly-user"  # Unmetered, so credits never run out
+LAG_METRIC = "recipebot_event_loop_lag_seconds"
+
+def _percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+def _lag_buckets(metrics_text):
+    """{le: cumulative count} of the event-loop lag histogram, summed over workers"""
+    buckets = {}
+    for match in re.finditer(rf'^{LAG_METRIC}_bucket{{le="([^"]+)"(?:,worker="\d+")?}} (\d+)$', metrics_text, re.M):
+        le = float(match.group(1))
+        buckets[le] = buckets.get(le, 0) + int(match.group(2))
+    return buckets
+
+def _lag_percentile(before, after, q):
+    """Upper bound (ms) of the bucket holding the q-th lag sample taken during the run"""
+    deltas = sorted((le, after.get(le, 0) - before.get(le, 0)) for le in after)
+    total = deltas[-1][1] if deltas else 0
+    if not total:
+        return 0.0
+    for le, cumulative in deltas:
+        if cumulative >= q * total:
+            return le * 1000
+    return float("inf")
+
+class Harness:
+    def __init__(self, args, tmp):
+        self.args = args
+        self.tmp = tmp
+        self.db_path = os.path.join(tmp, "loadtest.db")
+        self.ctx = multiprocessing.get_context("spawn")
+        self.stop_stubs = self.ctx.Event()
+        self.stubs = None
+        self.app = None
+        self.ports = None
+        self.base = None
+
+    def start(self):
+        ports_queue = self.ctx.Queue()
+        config = StubConfig(self.args.origin_latency_ms, self.args.llm_latency_ms, self.args.alby_latency_ms)
+        self.stubs = self.ctx.Process(target=serve_stubs, args=(config, ports_queue, self.stop_stubs), daemon=True)
+        self.stubs.start()
+        self.ports = ports_queue.get(timeout=30)
+
+        app_port = self.args.port
+        env = dict(
+            os.environ,
+            DB_PATH=self.db_path,
+            PROFILE_DIR=os.path.join(self.tmp, "profiles"),
+            ALBY_API_URL=f"http://127.0.0.1:{self.ports['alby']}",
+            ALBY_ACCESS_TOKEN="bench",
+            ALBY_WEBHOOK_SECRET="whsec_MfKQ9r8GKYqrTwjUPD8ILPZIo2LaLaSw",
+            ANTHROPIC_API_URL=f"http://127.0.0.1:{self.ports['anthropic']}/v1/messages",
+            OPENAI_API_URL=f"http://127.0.0.1:{self.ports['openai']}/v1/chat/completions",
+            ANTHROPIC_API_KEY="bench",
+            OPENAI_API_KEY="bench",
+            # Every fixture URL serves the same text, so with the content-fingerprint
+            # cache on, recipe-ai would only time the first LLM call
+            LLM_CACHE_MAX_ENTRIES="20000" if self.args.llm_cache else "0",
+        )
+        if self.args.workers:
+            env.update(
+                HOST="127.0.0.1",
+                PORT=str(app_port),
+                WEB_CONCURRENCY=str(self.args.workers),
+                WORKER_MAX_REQUESTS=str(self.args.max_requests),
+                METRICS_SNAPSHOT_INTERVAL="0.5",  # Other workers' lag shows up in /metrics before the run ends
+                LOG_LEVEL="warning",
+            )
+            command = [sys.executable, "-m", "app.serve"]
+        else:
+            command = [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(app_port), "--log-level", "warning"]
+        self.app = subprocess.Popen(command, cwd=REPO_ROOT, env=env)
+        self.base = f"http://127.0.0.1:{app_port}"
+        deadline = time.monotonic() + 60
+        while True:
+            try:
+                if httpx.get(self.base + "/metrics", timeout=1).status_code == 200:
+                    break
+            except httpx.HTTPError:
+                pass
+            if self.app.poll() is not None or time.monotonic() > deadline:
+                raise RuntimeError("App did not start, see its output above")
+            time.sleep(0.2)
+        self._seed()
+
+    def _seed(self):
+        """Users and invoices the scenarios need, written straight into the app's DB"""
+        con = sqlite3.connect(self.db_path, timeout=30)
+        con.execute(
+            "INSERT OR REPLACE INTO users (token, recipes_remaining, subscription_type) VALUES (?, 0, 'monthly')",
+            (BENCH_USER,)
+        )
+        self.settled = [uuid.uuid4().hex for _ in range(self.args.extract_invoices)]
+        self.pending = [uuid.uuid4().hex for _ in range(1000)]
+        con.executemany("INSERT INTO invoices (payment_hash, status) VALUES (?, 'settled')", [(h,) for h in self.settled])
+        con.executemany("INSERT INTO invoices (payment_hash, status) VALUES (?, 'pending')", [(h,) for h in self.pending])
+        con.commit()
+        con.close()
+        self.settled_iter = iter(self.settled)
+
+    def stop(self):
+        if self.app and self.app.poll() is None:
+            self.app.terminate()
+            try:
+                self.app.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                self.app.kill()
+        self.stop_stubs.set()
+        if self.stubs:
+            self.stubs.join(timeout=5)
+
+    def origin_url(self, page, n):
+        return f"http://127.0.0.1:{self.ports['origin']}/recipes/{page}?v={n}"
+
+    def request_factory(self, scenario):
+        """Returns an async fn(client) performing one request of the scenario"""
+        distinct = self.args.distinct_urls
+        counter = itertools.count()
+
+        def url_number():
+            n = next(counter)
+            return n % distinct if distinct else f"{uuid.uuid4().hex[:8]}-{n}"
+
+        if scenario in ("recipe-jsonld", "recipe-ai"):
+            page = "recipe_jsonld" if scenario == "recipe-jsonld" else "recipe_plain"
+            async def go(client):
+                return await client.post("/v1/extract-recipe", json={"url": self.origin_url(page, url_number()), "user_token": BENCH_USER})
+        elif scenario == "extract":
+            async def go(client):
+                payment_hash = next(self.settled_iter, "exhausted")
+                return await client.post("/v1/extract", json={"url": self.origin_url("recipe_plain", url_number()), "payment_hash": payment_hash})
+        elif scenario == "invoice":
+            async def go(client):
+                return await client.post("/v1/invoice", json={})
+        elif scenario == "status":
+            hashes = itertools.cycle(self.pending)
+            async def go(client):
+                return await client.get(f"/v1/invoice/status/{next(hashes)}")
+        else:
+            raise ValueError(f"Unknown scenario {scenario}")
+        return go
+
+    async def run(self, scenario, concurrency):
+        go = self.request_factory(scenario)
+        limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+        async with httpx.AsyncClient(base_url=self.base, limits=limits, timeout=120) as client:
+            # Warm-up: connections, pool workers, first-hit code paths
+            warm_until = time.perf_counter() + self.args.warmup
+            await asyncio.gather(*(self._worker(client, go, warm_until, [], {}) for _ in range(concurrency)))
+
+            before = _lag_buckets((await client.get("/metrics")).text)
+            latencies, errors = [], {}
+            start = time.perf_counter()
+            deadline = start + self.args.seconds
+            await asyncio.gather(*(self._worker(client, go, deadline, latencies, errors) for _ in range(concurrency)))
+            elapsed = time.perf_counter() - start
+            after = _lag_buckets((await client.get("/metrics")).text)
+
+        latencies.sort()
+        return {
+            "scenario": scenario,
+            "concurrency": concurrency,
+            "requests": len(latencies),
+            "errors": errors,
+            "rps": len(latencies) / elapsed,
+            "p50_ms": _percentile(latencies, 0.50) * 1000,
+            "p95_ms": _percentile(latencies, 0.95) * 1000,
+            "p99_ms": _percentile(latencies, 0.99) * 1000,
+            "loop_lag_p50_ms": _lag_percentile(before, after, 0.50),
+            "loop_lag_p99_ms": _lag_percentile(before, after, 0.99),
+        }
+
+    @staticmethod
+    async def _worker(client, go, deadline, latencies, errors):
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                response = await go(client)
+                key = None if response.status_code < 400 else str(response.status_code)
+                if key is None and response.headers.get("content-type") == "application/json" and response.json().get("status") == "error":
+                    key = "status=error"  # The extractors report failures in a 200 body
+            except httpx.HTTPError as e:
+                key = type(e).__name__
+            if key is None:
+                latencies.append(time.perf_counter() - start)
+            else:
+                errors[key] = errors.get(key, 0) + 1
+
+def _print_row(r):
+    errors = ",".join(f"{k}:{v}" for k, v in sorted(r["errors"].items())) or "-"
+    print(
+        f"{r['scenario']:<14} {r['concurrency']:>5} {r['requests']:>8} {r['rps']:>9.1f} "
+        f"{r['p50_ms']:>9.1f} {r['p95_ms']:>9.1f} {r['p99_ms']:>9.1f} "
+        f"{r['loop_lag_p50_ms']:>9.1f} {r['loop_lag_p99_ms']:>9.1f}  {errors}"
+    )
+
+async def main(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        harness = Harness(args, tmp)
+        try:
+            harness.start()
+            print(
+                f"origin {args.origin_latency_ms}ms, llm {args.llm_latency_ms}ms, alby {args.alby_latency_ms}ms, "
+                f"{args.seconds}s per run after {args.warmup}s warm-up, distinct urls: {args.distinct_urls or 'all'}"
+            )
+            print(
+                f"{'scenario':<14} {'conc':>5} {'ok':>8} {'rps':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} "
+                f"{'lag p50':>9} {'lag p99':>9}  errors"
+            )
+            results = []
+            for scenario in args.scenarios:
+                for concurrency in args.concurrency:
+                    result = await harness.run(scenario, concurrency)
+                    _print_row(result)
+                    results.append(result)
+            if args.json:
+                with open(args.json, "w") as f:
+                    json.dump(results, f, indent=2)
+        finally:
+            harness.stop()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=SCENARIOS)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--warmup", type=float, default=2.0)
+    parser.add_argument("--origin-latency-ms", type=float, default=50)
+    parser.add_argument("--llm-latency-ms", type=float, default=800)
+    parser.add_argument("--alby-latency-ms", type=float, default=150)
+    parser.add_argument("--distinct-urls", type=int, default=0, help="Cycle through this many page URLs (0 = every request is a new URL, no cache hits)")
+    parser.add_argument("--llm-cache", action="store_true", help="Keep the content-fingerprint LLM cache on (off by default, see Harness.start)")
+    parser.add_argument("--extract-invoices", type=int, default=50000, help="Settled invoices to seed; each /v1/extract request spends one")
+    parser.add_argument("--workers", type=int, default=0, help="Run the app with python -m app.serve and this many workers (0 = plain uvicorn)")
+    parser.add_argument("--max-requests", type=int, default=0, help="With --workers: recycle each worker after this many requests")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--json", help="Also write the results to this file")
+    args = parser.parse_args()
+    asyncio.run(main(args))
@@ -0,0 +1,147 @@
+"""Cold-start benchmark: import time of app.main and time until the app serves.
+
+Runs `python -X importtime -c "import app.main"` in fresh interpreters with no
+app config in the environment (importing must not need credentials), and
+reports the median import time, the slowest top-level imports and any heavy
+module that got imported eagerly. The raw -X importtime output of the median
+run can be saved to compare against later. --serve also starts uvicorn and
+times how long until /metrics answers (imports + startup hooks + pool warm-up).
+
+Exits non-zero if a heavy module is imported eagerly or the median import is
+over --budget-ms, so it can gate CI:
+
+    python -m benchmarks.startup_bench
+    python -m benchmarks.startup_bench --runs 10 --importtime-out importtime.txt --budget-ms 400
+    python -m benchmarks.startup_bench --serve
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Only imported once they're needed (first webhook, pool workers), never by app.main itself
+LAZY_MODULES = ("svix", "trafilatura", "lxml", "jwt", "stripe", "anthropic", "openai")
+APP_ENV_PREFIXES = ("ALBY_", "ANTHROPIC_", "OPENAI_", "DB_PATH")
+
+def _clean_env(**extra):
+    env = {k: v for k, v in os.environ.items() if not k.startswith(APP_ENV_PREFIXES)}
+    env.update(extra)
+    return env
+
+def parse_importtime(stderr: str):
+    """[(module, self us, cumulative us, depth)] from -X importtime output"""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        rows.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return rows
+
+def import_once():
+    """(rows, raw stderr, wall seconds, eagerly imported lazy modules) for one fresh interpreter"""
+    code = f"import sys; import app.main; print(','.join(m for m in {LAZY_MODULES!r} if m in sys.modules))"
+    start = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=REPO_ROOT, env=_clean_env(), capture_output=True, text=True,
+    )
+    wall = time.perf_counter() - start
+    if proc.returncode != 0:
+        raise RuntimeError(f"import app.main failed:\n{proc.stderr[-2000:]}")
+    eager = [m for m in proc.stdout.strip().split(",") if m]
+    return parse_importtime(proc.stderr), proc.stderr, wall, eager
+
+def serve_once(port: int) -> float:
+    """Seconds from launching uvicorn until /metrics answers"""
+    with tempfile.TemporaryDirectory() as tmp:
+        env = _clean_env(
+            DB_PATH=os.path.join(tmp, "startup.db"),
+            PROFILE_DIR=os.path.join(tmp, "profiles"),
+            ALBY_ACCESS_TOKEN="bench",
+            ALBY_WEBHOOK_SECRET="whsec_MfKQ9r8GKYqrTwjUPD8ILPZIo2LaLaSw",
+            INVOICE_POOL_SIZE="0",  # Nothing to mint against
+        )
+        start = time.perf_counter()
+        app = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+            cwd=REPO_ROOT, env=env, stdout=subprocess.DEVNULL,
+        )
+        try:
+            while True:
+                try:
+                    if httpx.get(f"http://127.0.0.1:{port}/metrics", timeout=1).status_code == 200:
+                        return time.perf_counter() - start
+                except httpx.HTTPError:
+                    pass
+                if app.poll() is not None or time.perf_counter() - start > 60:
+                    raise RuntimeError("App did not start")
+                time.sleep(0.01)
+        finally:
+            app.terminate()
+            app.wait(timeout=30)
+
+def main(runs, top, importtime_out, budget_ms, serve, port, json_path):
+    results = [import_once() for _ in range(runs)]
+    totals = [next(cumulative for name, _, cumulative, _ in rows if name == "app.main") for rows, _, _, _ in results]
+    median_run = sorted(zip(totals, range(runs)))[runs // 2][1]
+    rows, raw, _, eager = results[median_run]
+    median_ms = statistics.median(totals) / 1000
+    wall_ms = statistics.median(wall for _, _, wall, _ in results) * 1000
+
+    print(f"import app.main: median {median_ms:.0f} ms (min {min(totals) / 1000:.0f}, max {max(totals) / 1000:.0f}) over {runs} runs, "
+          f"interpreter wall {wall_ms:.0f} ms")
+    print()
+    print(f"{'slowest imports under app.main':<40} {'cumulative ms':>14} {'self ms':>8}")
+    direct = [r for r in rows if r[3] == 1]  # Imported directly by app.main or its app.* modules
+    for name, self_us, cumulative_us, _ in sorted(direct, key=lambda r: -r[2])[:top]:
+        print(f"{name:<40} {cumulative_us / 1000:>14.1f} {self_us / 1000:>8.1f}")
+
+    ready = []
+    if serve:
+        ready = [serve_once(port) for _ in range(runs)]
+        print()
+        print(f"uvicorn start to first /metrics: median {statistics.median(ready) * 1000:.0f} ms "
+              f"(min {min(ready) * 1000:.0f}, max {max(ready) * 1000:.0f})")
+
+    if importtime_out:
+        with open(importtime_out, "w") as f:
+            f.write(raw)
+        print(f"\n-X importtime output of the median run written to {importtime_out}")
+    if json_path:
+        with open(json_path, "w") as f:
+            json.dump({
+                "import_ms": median_ms,
+                "import_ms_runs": [t / 1000 for t in totals],
+                "ready_ms": statistics.median(ready) * 1000 if ready else None,
+                "eager_modules": eager,
+            }, f, indent=2)
+
+    failed = False
+    if eager:
+        print(f"\nFAIL: imported eagerly by app.main: {', '.join(eager)}")
+        failed = True
+    if budget_ms is not None and median_ms > budget_ms:
+        print(f"\nFAIL: median import {median_ms:.0f} ms is over the {budget_ms:.0f} ms budget")
+        failed = True
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15, help="Top-level imports to list")
+    parser.add_argument("--importtime-out", help="Write the raw -X importtime output of the median run here")
+    parser.add_argument("--budget-ms", type=float, help="Fail if the median import of app.main takes longer")
+    parser.add_argument("--serve", action="store_true", help="Also time uvicorn start until the app answers")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--json", help="Also write the results to this file")
+    args = parser.parse_args()
+    sys.exit(main(args.runs, args.top, args.importtime_out, args.budget_ms, args.serve, args.port, args.json))
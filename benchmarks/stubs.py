@@ -0,0 +1,179 @@
+"""Local stand-ins for everything the API talks to, for offline load tests.
+
+One process serves four HTTP servers on 127.0.0.1:
+  origin    - the recorded recipe pages in benchmarks/fixtures (/recipes/<name>?v=...)
+  anthropic - streaming Messages API (POST /v1/messages)
+  openai    - streaming Chat Completions API (POST /v1/chat/completions)
+  alby      - invoice creation (POST /invoices)
+
+Latencies are configurable so the numbers resemble production round-trips.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), "fixtures")
+
+# What the stub LLMs "extract", streamed in small deltas like the real APIs
+LLM_REPLY = json.dumps({
+    "title": "Fluffy Weekend Pancakes",
+    "description": "Light, fluffy pancakes from pantry staples.",
+    "ingredients": [
+        {"amount": "2", "unit": "cups", "item": "all-purpose flour", "notes": None},
+        {"amount": "1", "unit": "tablespoon", "item": "baking powder", "notes": None},
+        {"amount": "1 1/2", "unit": "cups", "item": "milk", "notes": None},
+        {"amount": "2", "unit": None, "item": "large eggs", "notes": None},
+    ],
+    "instructions": [
+        "Whisk the dry ingredients together.",
+        "Whisk the wet ingredients, then stir them into the dry ones.",
+        "Cook 1/4 cup portions on a hot griddle until golden on both sides.",
+    ],
+    "prep_time_minutes": 10,
+    "cook_time_minutes": 20,
+    "total_time_minutes": 30,
+    "servings": 4,
+    "cuisine": "American",
+    "course": "breakfast",
+    "difficulty": "easy",
+    "calories_per_serving": 320,
+    "author": "Fixture Cook",
+}, indent=2)
+LLM_CHUNK_CHARS = 12
+
+class StubConfig:
+    def __init__(self, origin_latency_ms: float = 50, llm_latency_ms: float = 800, alby_latency_ms: float = 150):
+        self.origin_latency = origin_latency_ms / 1000
+        self.llm_latency = llm_latency_ms / 1000  # Spread over the streamed chunks
+        self.alby_latency = alby_latency_ms / 1000
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    config: StubConfig = None
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status: int, body: bytes, content_type: str, headers=None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        try:
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # The app stops reading a page once it has the JSON-LD recipe
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length", 0))
+        return json.loads(self.rfile.read(length) or b"{}")
+
+class OriginHandler(_Handler):
+    pages = {}
+
+    def do_GET(self):
+        time.sleep(self.config.origin_latency)
+        name = self.path.split("?")[0].rsplit("/", 1)[-1]
+        page = self.pages.get(name)
+        if page is None:
+            self._send(404, b"not found", "text/plain")
+            return
+        body, etag = page
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self._send(200, body, "text/html; charset=utf-8", {"ETag": etag, "Cache-Control": "max-age=300"})
+
+class _StreamingHandler(_Handler):
+    def _stream(self, events):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        chunks = [LLM_REPLY[i:i + LLM_CHUNK_CHARS] for i in range(0, len(LLM_REPLY), LLM_CHUNK_CHARS)]
+        delay = self.config.llm_latency / (len(chunks) + 1)
+        time.sleep(delay)  # Time to first token
+        try:
+            for event in events(chunks, delay):
+                self.wfile.write(b"data: " + json.dumps(event).encode() + b"\n\n")
+                self.wfile.flush()
+            self.wfile.write(b"data: [DONE]\n\n")
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # The client stops reading once the JSON object is complete
+        self.close_connection = True
+
+class AnthropicHandler(_StreamingHandler):
+    def do_POST(self):
+        prompt = self._read_json()["messages"][0]["content"]
+
+        def events(chunks, delay):
+            yield {"type": "message_start", "message": {"usage": {"input_tokens": len(prompt) // 4, "output_tokens": 1}}}
+            for chunk in chunks:
+                yield {"type": "content_block_delta", "delta": {"type": "text_delta", "text": chunk}}
+                time.sleep(delay)
+            yield {"type": "message_delta", "usage": {"output_tokens": len(LLM_REPLY) // 4}}
+            yield {"type": "message_stop"}
+        self._stream(events)
+
+class OpenAIHandler(_StreamingHandler):
+    def do_POST(self):
+        prompt = self._read_json()["messages"][-1]["content"]
+
+        def events(chunks, delay):
+            for chunk in chunks:
+                yield {"choices": [{"delta": {"content": chunk}}]}
+                time.sleep(delay)
+            yield {"choices": [], "usage": {"prompt_tokens": len(prompt) // 4, "completion_tokens": len(LLM_REPLY) // 4}}
+        self._stream(events)
+
+class AlbyHandler(_Handler):
+    def do_POST(self):
+        body = self._read_json()
+        time.sleep(self.config.alby_latency)
+        payment_hash = uuid.uuid4().hex + uuid.uuid4().hex
+        invoice = {
+            "payment_hash": payment_hash,
+            "payment_request": f"lnbc{body.get('amount', 0)}n1stub{payment_hash}",
+            "amount": body.get("amount"),
+            "description": body.get("description"),
+        }
+        self._send(201, json.dumps(invoice).encode(), "application/json")
+
+def _load_pages():
+    pages = {}
+    for filename in os.listdir(FIXTURES_DIR):
+        if filename.endswith(".html"):
+            with open(os.path.join(FIXTURES_DIR, filename), "rb") as f:
+                body = f.read()
+            pages[filename[:-5]] = (body, '"' + hashlib.sha1(body).hexdigest()[:16] + '"')
+    return pages
+
+def _start(handler_cls, config):
+    handler = type(handler_cls.__name__, (handler_cls,), {"config": config})
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def serve_stubs(config: StubConfig, ports_queue, stop_event):
+    """Process entry point: start every stub, report their ports, run until stop_event is set"""
+    OriginHandler.pages = _load_pages()
+    servers = {
+        "origin": _start(OriginHandler, config),
+        "anthropic": _start(AnthropicHandler, config),
+        "openai": _start(OpenAIHandler, config),
+        "alby": _start(AlbyHandler, config),
+    }
+    ports_queue.put({name: server.server_address[1] for name, server in servers.items()})
+    stop_event.wait()
+    for server in servers.values():
+        server.shutdown()
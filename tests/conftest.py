@@ -0,0 +1,11 @@
+# tests/conftest.py
+import os
+import tempfile
+
+# The app reads its config at import time, so point it at a scratch database
+# (and the run/ and profile directories next to it) before any test imports it
+_tmp = tempfile.mkdtemp(prefix="recipebot-tests-")
+os.environ.setdefault("DB_PATH", os.path.join(_tmp, "test.db"))
+os.environ.setdefault("PROFILE_DIR", os.path.join(_tmp, "profiles"))
+# Run HTML parsing inline rather than spawning extraction worker processes
+os.environ.setdefault("CPU_POOL_WORKERS", "0")
@@ -0,0 +1,19 @@
+# tests/test_batch.py
+import asyncio
+from app.services import batch
+
+def test_busy_host_does_not_starve_others(monkeypatch):
+    monkeypatch.setattr(batch, "BATCH_PER_HOST_CONCURRENCY", 4)
+    urls = [f"https://a.test/recipe/{i}" for i in range(32)] + ["https://b.test/recipe/0"]
+
+    async def worker(url):
+        await asyncio.sleep(0.02)
+        return url
+
+    async def run():
+        return [url async for _, url, _ in batch.fan_out(urls, worker, concurrency=16)]
+
+    finished = asyncio.run(run())
+    assert len(finished) == len(urls)
+    # b.test gets a global slot straight away and finishes with a.test's first wave
+    assert finished.index("https://b.test/recipe/0") < 5
@@ -0,0 +1,18 @@
+# tests/test_durations.py
+from app.agents.recipe_extractor import parse_duration
+
+def test_parse_duration_whole_minutes():
+    assert parse_duration("PT15M") == 15
+    assert parse_duration("PT1H30M") == 90
+    assert parse_duration("P0DT0H45M") == 45
+    assert parse_duration("P1DT2H") == 1560
+
+def test_parse_duration_rounds_seconds_up():
+    assert parse_duration("PT30S") == 1
+    assert parse_duration("PT90S") == 2
+    assert parse_duration("PT0S") == 0
+
+def test_parse_duration_rejects_non_durations():
+    assert parse_duration("PT") is None
+    assert parse_duration("15 minutes") is None
+    assert parse_duration(None) is None
@@ -0,0 +1,34 @@
+# tests/test_retention.py
+import asyncio
+from app import database
+from app.services.retention import RetentionJob
+
+def test_retention_drops_stale_unpaid_invoices():
+    async def run():
+        await database.connect_to_db()
+        try:
+            db = await database.get_db()
+            await db.executemany(
+                "INSERT INTO invoices (payment_hash, status, created_at) VALUES (?, ?, datetime('now', ?))",
+                [
+                    ("old-pending", "pending", "-2 days"),
+                    ("old-expired", "expired", "-2 days"),  # Rotated out of the invoice pool
+                    ("old-settled", "settled", "-2 days"),
+                    ("new-pending", "pending", "-1 hours"),
+                    ("new-expired", "expired", "-1 hours"),
+                ]
+            )
+            await db.commit()
+
+            job = RetentionJob()
+            try:
+                await job.run_once()
+            finally:
+                await job.stop()
+
+            rows = await db.execute_fetchall("SELECT payment_hash FROM invoices ORDER BY payment_hash")
+            return [payment_hash for (payment_hash,) in rows]
+        finally:
+            await database.close_db()
+
+    assert asyncio.run(run()) == ["new-expired", "new-pending", "old-settled"]
@@ -0,0 +1,14 @@
+# tests/test_startup.py
+from fastapi.testclient import TestClient
+
+def test_starts_without_alby_token(monkeypatch):
+    monkeypatch.delenv("ALBY_ACCESS_TOKEN", raising=False)
+    monkeypatch.delenv("ALBY_WEBHOOK_SECRET", raising=False)
+    from app.main import app
+
+    with TestClient(app) as client:  # Runs the startup and shutdown hooks
+        assert client.get("/metrics").status_code == 200
+        # Only invoicing needs the token, and it fails per request instead
+        response = client.post("/v1/invoice", json={})
+        assert response.status_code == 500
+        assert "ALBY_ACCESS_TOKEN" in response.json()["detail"]